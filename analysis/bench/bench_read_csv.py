@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+# Loading many result files: read_csv_files (parse all, concatenate once)
+# against growing the frame file by file, like the DataFrame.append loop
+# that Experiment.load_result_data used before.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from colortilt.io import read_csv_files
+from colortilt.schema import RESULT_COLUMNS, RESULT_DTYPES
+
+
+def make_files(path, n, trials=216, seed=0):
+    rng = np.random.RandomState(seed)
+    files = []
+    for i in range(n):
+        df = pd.DataFrame({'size': rng.choice([10, 40, 160], trials),
+                           'bg': rng.choice(np.arange(-1, 360, 45), trials),
+                           'fg': rng.uniform(0, 360, trials).round(1),
+                           'phi_start': rng.uniform(0, 360, trials).round(3),
+                           'phi': rng.uniform(0, 360, trials).round(3),
+                           'side': rng.choice(['l', 'r'], trials),
+                           'duration': rng.uniform(0.5, 5, trials).round(5)},
+                          columns=RESULT_COLUMNS)
+        name = os.path.join(path, '%08dT%04d.dat' % (20150101 + i // 100, i % 100))
+        df.to_csv(name, index=False)
+        files.append(name)
+    return files
+
+
+def append_loop(files):
+    df = pd.read_csv(files[0], skipinitialspace=True, dtype=RESULT_DTYPES)
+    for name in files[1:]:
+        df = pd.concat([df, pd.read_csv(name, skipinitialspace=True, dtype=RESULT_DTYPES)],
+                       ignore_index=True)
+    return df
+
+
+def timed(func, *args):
+    start = time.time()
+    res = func(*args)
+    return time.time() - start, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark loading of many result files')
+    parser.add_argument('counts', nargs='*', type=int, default=[10, 100, 1000, 3000])
+    parser.add_argument('--max-loop', dest='max_loop', type=int, default=3000,
+                        help='skip the append loop for more files than this')
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='ct-bench-')
+    try:
+        print('%8s %14s %14s' % ('files', 'append-loop', 'concat-once'))
+        for n in args.counts:
+            files = make_files(path, n)
+            t_new, new = timed(read_csv_files, files, RESULT_DTYPES)
+            if n <= args.max_loop:
+                t_old, old = timed(append_loop, files)
+                pd.testing.assert_frame_equal(old, new)
+                loop = '%13.2fs' % t_old
+            else:
+                loop = '%14s' % '-'
+            print('%8d %s %13.2fs' % (n, loop, t_new))
+            for name in files:
+                os.remove(name)
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+# Cohort analyses: spread --sizerel and the size order of ct-order against
+# the per-group DataFrame.groupby().apply() versions they replaced.
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from colortilt.pipeline import load_source
+from colortilt.tools.spread import spread
+
+
+def make_cohort(subjects, seed=0):
+    rng = np.random.RandomState(seed)
+    bg = np.arange(0, 360, 45.0)
+    fg = np.arange(-157.5, 180, 22.5)
+    sizes = np.array([10, 40, 160])
+    B, F, S, U = np.meshgrid(bg, fg, sizes, np.arange(subjects), indexing='ij')
+    df = pd.DataFrame({'bg': B.ravel(), 'size': S.ravel(), 'fg': F.ravel(),
+                       'subject': np.char.add('s', U.ravel().astype(str)), 'N': 10.0,
+                       'err': rng.uniform(0.5, 2, B.size), 'shift': rng.normal(0, 10, B.size)})
+    return df.sort_values(['bg', 'size', 'fg', 'subject']).reset_index(drop=True)
+
+
+def old_calc_spread(row):
+    upper = np.max(row['shift'])
+    lower = np.min(row['shift'])
+    iu = row['shift'].idxmax()
+    il = row['shift'].idxmin()
+    ref = np.mean(row.loc[row['size'] == 40]['shift'].values)
+    return pd.Series({'lower': lower, 'ref': ref, 'size_lower': row.loc[il]['size'],
+                      'size_upper': row.loc[iu]['size'], 'spread': upper - lower, 'upper': upper})
+
+
+def old_sizerel(df):
+    idx = ['bg', 'fg', 'subject']
+    x = df.groupby(idx).apply(old_calc_spread).reset_index()
+    smax = x.loc[x.groupby(['bg', 'subject']).spread.idxmax()][idx]
+    s = df.set_index(idx).loc[[tuple(r) for r in smax.to_records(index=False)]].copy()
+    return s.rename(columns={'shift': 'm_mean', 'err': 'm_merr'}).reset_index()
+
+
+def old_order(df, groups):
+    index = {x: i for i, x in enumerate(itertools.permutations([160, 40, 10]))}
+
+    def find_order(g):
+        k = np.array(g['shift']).argsort(kind='mergesort')
+        return pd.Series({'order': index[tuple(int(g.iloc[l]['size']) for l in k)]})
+
+    return df.groupby(groups).apply(find_order).reset_index()['order'].values
+
+
+def timed(func, *args):
+    start = time.time()
+    res = func(*args)
+    return time.time() - start, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the cohort analyses')
+    parser.add_argument('counts', nargs='*', type=int, default=[10, 100, 1000],
+                        help='number of subjects')
+    parser.add_argument('--max-old', dest='max_old', type=int, default=1000,
+                        help='skip the groupby versions for more subjects than this')
+    args = parser.parse_args()
+
+    order = load_source('ct_order', os.path.join(HERE, '..', 'ct-order.py'))
+    groups = ['bg', 'fg', 'subject']
+    sizerel = argparse.Namespace(sizerel=True, maxspread=False, slrel=None)
+
+    print('%8s %8s %26s %26s' % ('subjects', 'rows', 'spread --sizerel', 'size order'))
+    for n in args.counts:
+        df = make_cohort(n)
+        t_spread, new_spread = timed(spread, df.copy(), sizerel)
+        t_order, (_, _, new_order) = timed(order.size_order, df, groups)
+        if n <= args.max_old:
+            t_os, old_spread = timed(old_sizerel, df.copy())
+            t_oo, old_ord = timed(old_order, df, groups)
+            pd.testing.assert_frame_equal(new_spread.reset_index(drop=True), old_spread, check_dtype=False)
+            assert (old_ord == new_order).all()
+            cols = ['%9.2fs -> %7.2fs' % (t_os, t_spread), '%9.2fs -> %7.2fs' % (t_oo, t_order)]
+        else:
+            cols = ['%26s' % ('%.2fs' % t_spread), '%26s' % ('%.2fs' % t_order)]
+        print('%8d %8d %s %s' % (n, len(df), cols[0], cols[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+
+def angle_shift(phi, baseline, input_is_radiants=False):
+    """Signed angular difference phi - baseline in degrees, within [-180, 180]
+
+    Works element-wise on arrays (or Series); a baseline of -1 denotes
+    the control condition and is treated as 0.
+    """
+    phi = np.asarray(phi, dtype=np.float64)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    baseline = np.where(baseline == -1, 0.0, baseline)
+
+    if input_is_radiants:
+        phi = phi/np.pi*180.0
+        baseline = baseline/np.pi*180.0
+
+    shift = phi - baseline
+    shift -= (shift > 180.0) * 360.0
+    shift += (shift < -180.0) * 360.0
+    return shift
+
+
+def calc_angle_shift(phi, baseline, input_is_radiants=False):
+    """Scalar angle_shift, the reference implementation it is tested against"""
+    # control is -1, make it 0
+    if baseline == -1:
+        baseline = 0
+    if input_is_radiants:
+        phi = phi/np.pi*180.0
+        baseline = baseline/np.pi*180.0
+    shift = float(phi - baseline)
+    shift += (shift >  180.0) * -360
+    shift += (shift < -180.0) *  360
+    return shift
@@ -0,0 +1,260 @@
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 2
+
+
+def series_to_array(series):
+    """Convert a column into a numpy array that can be stored in a npz file
+
+    Returns the array and a boolean mask of missing values, which is
+    only needed (and not None) for object columns, i.e. strings.
+    """
+    if series.dtype.kind not in 'biufcmM':
+        null = np.asarray(pd.isnull(series))
+        data = np.array([u'' if n else u'%s' % v for v, n in zip(series, null)], dtype='U')
+        return data, null
+    return np.asarray(series), None
+
+
+def array_to_series(data, null=None):
+    if data.dtype.kind != 'U':
+        return data
+    data = data.astype(object)
+    if null is not None:
+        data[null] = np.nan
+    return data
+
+
+def options_key(options):
+    """Digest of the keyword arguments a file was parsed with"""
+    items = sorted((k, sorted(v.items()) if isinstance(v, dict) else v) for k, v in (options or {}).items())
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """Binary, columnar cache for parsed result files of one subject
+
+    Every cached file is stored with its size, modification time and
+    the parser options it was read with; if any of them changed the
+    file is parsed again. If path is None the cache lives in memory
+    only and is never saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if path is not None and os.path.exists(path):
+            try:
+                self.entries = self.__load()
+            except (IOError, ValueError, KeyError) as e:
+                sys.stderr.write("[W] ignoring broken cache %s: %s\n" % (path, str(e)))
+                self.dirty = True
+
+    @staticmethod
+    def stat(filename):
+        st = os.stat(filename)
+        return int(st.st_size), float(st.st_mtime)
+
+    def is_valid(self, filename, options=None):
+        key = os.path.abspath(filename)
+        entry = self.entries.get(key)
+        return entry is not None and entry[0] == self.stat(key) and entry[1] == options_key(options)
+
+    def stale(self, file_list, options=None):
+        return [f for f in file_list if not self.is_valid(f, options)]
+
+    def add(self, filename, df, options=None):
+        key = os.path.abspath(filename)
+        self.entries[key] = (self.stat(key), options_key(options), df)
+        self.dirty = True
+
+    def read_csv(self, filename, **kwargs):
+        if not self.is_valid(filename, kwargs):
+            self.add(filename, pd.read_csv(filename, **kwargs), kwargs)
+        return self.entries[os.path.abspath(filename)][2].copy()
+
+    def prune(self):
+        gone = [k for k in self.entries if not os.path.exists(k)]
+        for k in gone:
+            del self.entries[k]
+        self.dirty = self.dirty or len(gone) > 0
+        return gone
+
+    def clear(self):
+        self.entries = {}
+        self.dirty = False
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def save(self):
+        self.prune()
+        if self.path is None or not self.dirty:
+            return
+
+        files = sorted(self.entries)
+        arrays = {'__version': np.array([CACHE_VERSION]),
+                  '__files': np.array(files, dtype='U'),
+                  '__size': np.array([self.entries[f][0][0] for f in files], dtype=np.int64),
+                  '__mtime': np.array([self.entries[f][0][1] for f in files], dtype=np.float64),
+                  '__options': np.array([self.entries[f][1] for f in files], dtype='U'),
+                  '__columns': np.array([u','.join(self.entries[f][2].columns) for f in files], dtype='U')}
+
+        for i, f in enumerate(files):
+            df = self.entries[f][2]
+            for k, col in enumerate(df.columns):
+                data, null = series_to_array(df[col])
+                arrays['f%d_c%d' % (i, k)] = data
+                if null is not None:
+                    arrays['f%d_c%d_null' % (i, k)] = null
+
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        # write to a temporary file first so that readers never see
+        # a partially written cache
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as fd:
+            np.savez(fd, **arrays)
+        os.rename(tmp, self.path)
+        self.dirty = False
+
+    def __load(self):
+        entries = {}
+        with np.load(self.path) as npz:
+            if int(npz['__version'][0]) != CACHE_VERSION:
+                self.dirty = True
+                return entries
+            files = npz['__files']
+            sizes = npz['__size']
+            mtimes = npz['__mtime']
+            options = npz['__options']
+            columns = npz['__columns']
+            for i, f in enumerate(files):
+                names = columns[i].split(u',') if len(columns[i]) else []
+                data = {}
+                for k, col in enumerate(names):
+                    key = 'f%d_c%d' % (i, k)
+                    null = npz[key + '_null'] if (key + '_null') in npz.files else None
+                    data[col] = array_to_series(npz[key], null)
+                df = pd.DataFrame(data, columns=names)
+                entries[u'%s' % f] = ((int(sizes[i]), float(mtimes[i])), u'%s' % options[i], df)
+        return entries
+
+
+def table_digest(df):
+    """Bytes that identify the contents of a DataFrame, e.g. for RenderCache.make_key"""
+    header = u'%s' % [[str(c), str(t)] for c, t in zip(df.columns, df.dtypes)]
+    return header.encode('utf-8') + pd.util.hash_pandas_object(df, index=False).values.tobytes()
+
+
+class RenderCache(object):
+    """Content-addressed, size-bounded cache of rendered files, e.g. plots
+
+    Every entry is a directory, named by its key (see make_key), with
+    the files rendered for it. Restoring an entry copies (or hard
+    links) its files to an output directory and marks it as used; once
+    the cache grows beyond max_size bytes, the least recently used
+    entries are removed.
+    """
+
+    def __init__(self, path, max_size=1 << 30, link=False):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        self.link = link
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    @staticmethod
+    def make_key(*parts):
+        h = hashlib.sha1()
+        for part in parts:
+            data = part if isinstance(part, bytes) else (u'%s' % part).encode('utf-8')
+            h.update(str(len(data)).encode('ascii') + b':' + data)
+        return h.hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.path, key)
+
+    def has(self, key):
+        return os.path.isdir(self.entry(key))
+
+    def files(self, key):
+        return sorted(os.listdir(self.entry(key)))
+
+    def restore(self, key, dest):
+        """Copy (or link) the files of the entry to dest, returns their paths"""
+        src = self.entry(key)
+        if dest and not os.path.exists(dest):
+            os.makedirs(dest)
+        os.utime(src, None)
+        out = []
+        for name in self.files(key):
+            target = os.path.join(dest, name)
+            if os.path.exists(target):
+                os.remove(target)
+            if self.link:
+                try:
+                    os.link(os.path.join(src, name), target)
+                    out.append(target)
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(os.path.join(src, name), target)
+            out.append(target)
+        return out
+
+    def staging(self):
+        """A new directory to render the files of an entry into"""
+        return tempfile.mkdtemp(prefix='.tmp-', dir=self.path)
+
+    def store(self, key, staging):
+        """Make the rendered files in staging the entry for key"""
+        if self.has(key):
+            shutil.rmtree(staging)
+        else:
+            os.rename(staging, self.entry(key))
+        os.utime(self.entry(key), None)
+        self.evict(keep=key)
+
+    def entries(self):
+        """(last use, size, key) of all entries"""
+        res = []
+        for key in os.listdir(self.path):
+            p = self.entry(key)
+            if key.startswith('.') or not os.path.isdir(p):
+                continue
+            size = sum(os.path.getsize(os.path.join(p, f)) for f in os.listdir(p))
+            res.append((os.path.getmtime(p), size, key))
+        return sorted(res)
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache fits max_size"""
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = []
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry(key), ignore_errors=True)
+            total -= size
+            removed.append(key)
+        return removed
+
+    def clear(self):
+        for _, _, key in self.entries():
+            shutil.rmtree(self.entry(key), ignore_errors=True)
@@ -2,12 +2,20 @@ from __future__ import print_function
 from __future__ import division
 
 import pandas as pd
-import yaml
 import sys, os
 import fnmatch
 import datetime
+import multiprocessing
 import numpy as np
 
+from colortilt.cache import ResultCache
+from colortilt.manifest import Manifest
+from colortilt.io import read_csv_files, CsvReader
+from colortilt.schema import apply_schema, RESULT_COLUMNS, RESULT_DTYPES
+
+# how result files are parsed, also part of their cache entries
+READ_OPTIONS = {'skipinitialspace': True, 'dtype': RESULT_DTYPES}
+
 
 class Experiment(object):
 
@@ -17,6 +25,7 @@ class Experiment(object):
 
     @staticmethod
     def load_from_path(path):
+        import yaml
         path = os.path.expanduser(path)
         sys.stderr.write("[I] loading exp: %s\n" % path)
         f = open(path)
@@ -31,6 +40,27 @@ class Experiment(object):
         data_path = os.path.join(os.path.dirname(self.path), data_dir)
         return data_path
 
+    @property
+    def cachepath(self):
+        if 'cache-path' in self.__data:
+            cache_dir = os.path.expanduser(self.__data['cache-path'])
+            return os.path.join(os.path.dirname(self.path), cache_dir)
+        return os.path.join(self.datapath, '.cache')
+
+    def result_cache(self, subject):
+        return ResultCache(os.path.join(self.cachepath, subject + '.npz'))
+
+    @property
+    def manifest_path(self):
+        return os.path.splitext(self.path)[0] + '.manifest'
+
+    def manifest(self, path=None):
+        return Manifest(path or self.manifest_path, self.datapath)
+
+    @property
+    def store_path(self):
+        return os.path.splitext(self.path)[0] + '.trials.csv'
+
     def subject_data_path(self, subject):
         data_path = os.path.join(self.datapath, subject)
         if not os.path.exists(data_path):
@@ -41,7 +71,7 @@ class Experiment(object):
         data_path = self.subject_data_path(subject)
         filelist = map(lambda x: os.path.join(data_path, x),
                        filter(lambda x: fnmatch.fnmatch(x, "*.dat"),
-                              os.listdir(data_path)))
+                              sorted(os.listdir(data_path))))
         if filterfn is not None:
             if not callable(filterfn):
                 if type(filterfn) == str:
@@ -49,28 +79,55 @@ class Experiment(object):
                 else:
                     raise ValueError('Unsupported filter')
             filelist = filter(filterfn, filelist)
-        return filelist
+        return list(filelist)
 
-    def load_result_data(self, subject, filterfn=None):
+    def load_result_data(self, subject, filterfn=None, use_cache=True, cache=None):
         file_list = self.result_file_list(subject, filterfn=filterfn)
-        df = pd.read_csv(file_list[0], skipinitialspace=True)
-        if len(file_list) > 1:
-            for data in file_list[1:]:
-                to_append = pd.read_csv(data, skipinitialspace=True)
-                fname = os.path.basename(data)
-                to_append['date'] = datetime.datetime.strptime(fname[:13], '%Y%m%dT%H%M')
-                df = df.append(to_append, ignore_index=True)
-
-        notused = set(df.columns) - {'size', 'bg', 'fg', 'phi_start', 'side', 'duration', 'phi', 'date'}
-        for column in list(notused):
-            del df[column]
+        if cache is None and use_cache:
+            cache = self.result_cache(subject)
+        reader = cache.read_csv if cache is not None else pd.read_csv
+        used = set(RESULT_COLUMNS)
+
+        def prepare(filename, df):
+            df = df.drop([c for c in df.columns if c not in used], axis=1)
+            fname = os.path.basename(filename)
+            df['date'] = datetime.datetime.strptime(fname[:13], '%Y%m%dT%H%M')
+            return df
+
+        df = read_csv_files(file_list, dtype=RESULT_DTYPES, prepare=prepare, reader=reader)
         df['subject'] = subject
+        apply_schema(df)
+
+        if cache is not None:
+            cache.save()
         return df
 
+    def load_subjects_data(self, subjects, filterfn=None, use_cache=True, pool=None):
+        """Load the result data of all subjects into one DataFrame
+
+        If a process pool is given, all files that are not (validly)
+        cached are parsed in parallel, across all subjects, before the
+        data is assembled in the order of subjects and files.
+        """
+        caches = [self.result_cache(s) if use_cache else ResultCache(None) for s in subjects]
+
+        if pool is not None:
+            todo = [(c, f) for s, c in zip(subjects, caches)
+                    for f in c.stale(self.result_file_list(s, filterfn=filterfn), READ_OPTIONS)]
+            parse = CsvReader(**READ_OPTIONS)
+            frames = pool.map(parse, [f for _, f in todo])
+            for (c, f), df in zip(todo, frames):
+                c.add(f, df, READ_OPTIONS)
+
+        dfs = [self.load_result_data(s, filterfn, cache=c) for s, c in zip(subjects, caches)]
+        df = pd.concat(dfs, ignore_index=True)
+        return apply_schema(df)
+
     @property
     def subjects(self):
         dpath = self.datapath
-        dirs = filter(os.path.isdir, map(lambda x: os.path.join(dpath, x), os.listdir(dpath)))
+        names = filter(lambda x: not x.startswith('.'), sorted(os.listdir(dpath)))
+        dirs = filter(os.path.isdir, map(lambda x: os.path.join(dpath, x), names))
         return map(os.path.basename, dirs)
 
 
@@ -82,40 +139,118 @@ class GroupedContext(object):
         self.indices = indicies
 
     def __getitem__(self, item):
-        idx = self.gd.groups.index(item)
+        idx = self.gd[item]
         return self.indices[idx], self.group[idx]
 
     def __contains__(self, item):
-        return item in self.gd.groups
+        return item in self.gd
+
+
+def factorize(values):
+    """Unique values and the code for every value, -1 for missing values"""
+    values = np.asarray(values)
+    null = np.asarray(pd.isnull(values))
+    codes = np.full(len(values), -1, dtype=np.int64)
+    uniques, codes[~null] = np.unique(values[~null], return_inverse=True)
+    return uniques, codes
 
 
 class GroupedData(object):
-    def __init__(self, data_frame, groups):
+    """Rows of a DataFrame grouped by the values of several columns
+
+    Groups are determined via the unique values of every column and
+    the rows are stably sorted by group once (and optionally within the
+    group by the column sort_by). Besides iterating over the groups
+    (data, apply) the grouping can be used for segmented array access:
+    column(name) returns the values sorted by group, and group i is
+    column(name)[offsets[i]:offsets[i+1]]; reduce() applies a numpy
+    ufunc to all groups at once. Like DataFrame.groupby, rows with
+    missing values in any of the group columns are ignored.
+    """
+
+    def __init__(self, data_frame, groups, sort_by=None):
         df = data_frame
         self.data_frame = df
-        self.groups = groups
-        self.df_grouped = df.groupby(groups)
-        self.uniquely = map(lambda x: tuple(np.unique(df[x])), groups)
+        self.groups = list(groups)
+        self.__index = {k: i for i, k in enumerate(self.groups)}
+
+        uniques, codes = zip(*[factorize(df[k]) for k in self.groups])
+        self.uniquely = [tuple(u) for u in uniques]
+        shape = tuple(max(len(u), 1) for u in uniques)
+
+        valid = np.all([c >= 0 for c in codes], axis=0)
+        rows = np.flatnonzero(valid)
+        gid = np.ravel_multi_index([c[valid] for c in codes], shape)
+
+        if sort_by is not None:
+            order = np.lexsort((np.asarray(df[sort_by])[valid], gid))
+        else:
+            order = np.argsort(gid, kind='mergesort')
+
+        gid = gid[order]
+        self.order = rows[order]
+        starts = np.flatnonzero(np.diff(gid)) + 1
+        self.offsets = np.concatenate(([0], starts, [len(gid)])) if len(gid) else np.zeros(1, dtype=np.int64)
+        self.indices = np.transpose(np.unravel_index(gid[self.offsets[:-1]], shape))
+
+        # group number of every row of the data frame (-1 if not in any group)
+        self.row_group = np.full(len(df), -1, dtype=np.int64)
+        self.row_group[self.order] = np.repeat(np.arange(len(self)), np.diff(self.offsets))
 
     def __getitem__(self, item):
-        return self.groups.index(item)
+        return self.__index[item]
+
+    def __contains__(self, item):
+        return item in self.__index
+
+    def __len__(self):
+        return len(self.offsets) - 1
 
     def unique(self, item):
         idx = self[item]
         return self.uniquely[idx]
 
+    def key_column(self, name):
+        """The value of the group column name for every group"""
+        k = self[name]
+        return np.asarray(self.uniquely[k])[self.indices[:, k]]
+
+    def key(self, i):
+        return tuple(u[k] for u, k in zip(self.uniquely, self.indices[i]))
+
+    @property
+    def keys(self):
+        return [self.key(i) for i in range(len(self))]
+
+    @property
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def column(self, name):
+        return np.asarray(self.data_frame[name])[self.order]
+
+    def reduce(self, ufunc, name):
+        """Apply ufunc.reduceat to the column name, i.e. one value per group"""
+        if len(self) == 0:
+            return np.array([])
+        return ufunc.reduceat(self.column(name), self.offsets[:-1])
+
+    def context(self, i):
+        return GroupedContext(self, i, self.key(i), tuple(self.indices[i]))
+
     def apply(self, func):
         for data, context in self.data:
             func(data, self, context)
 
     @property
     def data(self):
-        for i, group in enumerate(self.df_grouped.groups):
-            indices = map(lambda g, u: u.index(g), group, self.uniquely)
-            context = GroupedContext(self, i, group, indices)
-            try:
-                data = self.df_grouped.get_group(group)
-            except KeyError:
-                print('[W] group not present %s' % str(group), file=sys.stderr)
-                continue
-            yield data, context
\ No newline at end of file
+        df = self.data_frame
+        for i in range(len(self)):
+            rows = self.order[self.offsets[i]:self.offsets[i+1]]
+            yield df.iloc[rows], self.context(i)
+
+
+def make_pool(jobs):
+    """Process pool with jobs processes (0: all cores), None for a single one"""
+    jobs = jobs or multiprocessing.cpu_count()
+    return multiprocessing.Pool(jobs) if jobs > 1 else None
@@ -1,32 +1,218 @@
 #!/usr/bin/env python
 from __future__ import print_function
+from __future__ import division
 
 import numpy as np
-import scipy.optimize
+
+from colortilt.models import least_squares
+
 
 def ellipse(a, b, phi, x):
     return (a*b)/(np.sqrt((a*np.sin(x - phi))**2+(b*np.cos(x - phi))**2))
 
+
+def ellipse_jacobian(a, b, phi, x):
+    """Partial derivatives of ellipse(a, b, phi, x) with respect to a, b and phi
+
+    The derivatives are stacked along a new last axis.
+    """
+    s, c = np.sin(x - phi), np.cos(x - phi)
+    d = ((a*s)**2 + (b*c)**2)**1.5
+    return np.stack([b**3 * c**2 / d, a**3 * s**2 / d, a*b*(a**2 - b**2) * s*c / d], axis=-1)
+
+
 def to_fit_func(x, y, a, b, phi):
     res = y - ellipse(a, b, phi, x)
     return res
 
 
+def initial_parameters(x, y, sw):
+    """Closed-form start values for fit_ellipses
+
+    1/ellipse(a, b, phi, x)**2 is linear in 1, cos(2x) and sin(2x), so
+    a (weighted) least squares fit of 1/y**2 gives a, b and phi
+    directly; sw are the square roots of the weights. Where that does
+    not describe an ellipse, a circle-like start of the size of y is
+    used.
+    """
+    w = (sw > 0) & (y != 0)
+    sw = np.where(w, sw, 0.0)
+    c, s = np.cos(2*x), np.sin(2*x)
+    X = np.stack([np.ones_like(x), c, s], axis=-1) * sw[..., np.newaxis]
+    z = np.where(w, 1.0/np.where(w, y, 1.0)**2, 0.0) * sw
+    with np.errstate(invalid='ignore', divide='ignore'):
+        A = np.einsum('kpi,kpj->kij', X, X)
+        g = np.einsum('kpi,kp->ki', X, z)
+        coef = np.matmul(np.linalg.pinv(A), g[..., np.newaxis])
+        k, u, v = coef[..., 0].T
+        r = np.hypot(u, v)
+        a = 1.0/np.sqrt(k + r)
+        b = 1.0/np.sqrt(k - r)
+        rms = np.sqrt(np.sum((sw*y)**2, axis=1) / np.sum(sw*sw, axis=1))
+    phi = np.arctan2(v, u) / 2.0
+    bad = ~(np.isfinite(a) & np.isfinite(b) & (a > 0) & (b > 0))
+    a = np.where(bad, 1.1 * rms, a)
+    b = np.where(bad, 0.9 * rms, b)
+    return np.stack([a, b, np.where(np.isfinite(phi), phi, 0.0)], axis=-1)
+
+
+def ellipse_values(p, x):
+    return ellipse(p[:, 0:1], p[:, 1:2], p[:, 2:3], x)
+
+
+def ellipse_derivatives(p, x):
+    return ellipse_jacobian(p[:, 0:1], p[:, 1:2], p[:, 2:3], x)
+
+
+def fit_ellipses(x, y, p0=None, weights=None, max_iter=100, tol=1e-10):
+    """Least squares fit of ellipse(a, b, phi, x) to every row of y
+
+    y is a (fits, points) array, NaN for missing points, and x has
+    either one value per point or the shape of y. All fits run at once
+    in one vectorized Levenberg-Marquardt loop (models.least_squares)
+    with the analytic Jacobian (ellipse_jacobian). Unless p0 is given,
+    the start values come from initial_parameters. Weights (same shape
+    as y) count how often every point is taken, e.g. the draws of a
+    bootstrap resample; points with weight 0 are left out.
+
+    Returns the (fits, 3) parameters a, b (positive) and phi (in
+    [0, pi)), their (fits, 3, 3) covariance, scaled by the residual
+    variance like scipy.optimize.curve_fit (NaN for less than four
+    points), and whether every fit converged.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    x = np.broadcast_to(np.asarray(x, dtype=np.float64), y.shape)
+    w = np.ones(y.shape) if weights is None else np.asarray(weights, dtype=np.float64)
+    w = np.where(np.isfinite(y) & np.isfinite(x) & (w > 0), w, 0.0)
+
+    if p0 is None:
+        p0 = initial_parameters(np.where(w > 0, x, 0.0), np.where(w > 0, y, 0.0), np.sqrt(w))
+    p, cov, converged, _, _ = least_squares(ellipse_values, ellipse_derivatives, x, y, p0,
+                                            weights=w, max_iter=max_iter, tol=tol)
+
+    # same ellipse with positive axes and phi in [0, pi)
+    sign = np.stack([np.sign(p[:, 0]), np.sign(p[:, 1]), np.ones(len(p))], axis=-1)
+    sign[sign == 0] = 1
+    cov *= sign[:, :, np.newaxis] * sign[:, np.newaxis, :]
+
+    p = p * sign
+    p[:, 2] = np.mod(p[:, 2], np.pi)
+    return p, cov, converged
+
+
+def ellipse_shape(params, cov=None):
+    """Axis ratio, eccentricity and orientation of the major axis for fitted ellipses
+
+    The orientation is in [0, pi); with the covariance of fit_ellipses,
+    its standard error is returned as well.
+    """
+    params = np.atleast_2d(params)
+    a, b, phi = params[:, 0], params[:, 1], params[:, 2]
+    major, minor = np.maximum(a, b), np.minimum(a, b)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = major / minor
+        eccentricity = np.sqrt(1.0 - (minor / major)**2)
+    orientation = np.mod(np.where(a >= b, phi, phi + np.pi / 2.0), np.pi)
+    if cov is None:
+        return ratio, eccentricity, orientation
+    return ratio, eccentricity, orientation, np.sqrt(cov[:, 2, 2])
+
+
+def circular_interval(values, center, alpha, period=np.pi):
+    """Percentile interval of angles with the given period around center
+
+    The differences to center are wrapped to [-period/2, period/2)
+    before taking the percentiles, so the bounds can lie outside of
+    [0, period) when the interval contains 0.
+    """
+    d = np.mod(values - center + period / 2.0, period) - period / 2.0
+    lo, hi = np.percentile(d, [50.0 * alpha, 100.0 - 50.0 * alpha])
+    return center + lo, center + hi
+
+
+class EllipseBootstrap(object):
+    """Picklable bootstrap of an ellipse fit, e.g. for multiprocessing.Pool.map
+
+    Called with (i, j, n, x, y, units) it draws n resamples of the
+    units (one per point, e.g. the subject, or the point itself) with
+    replacement and refits the ellipse to all resamples at once, the
+    number of draws of its unit being the weight of every point. Chunk
+    j of the resamples of group i uses a random stream seeded with
+    (seed, i, j), so the result does not depend on how the chunks are
+    distributed over processes. Returns the ratio, eccentricity and
+    orientation of the resamples whose fit converged.
+    """
+
+    def __init__(self, seed=0, max_iter=100):
+        self.seed = seed
+        self.max_iter = max_iter
+
+    def __call__(self, item):
+        i, j, n, x, y, units = item
+        keep = np.isfinite(x) & np.isfinite(y) & np.isfinite(units)
+        x, y = x[keep], y[keep]
+        codes, units = np.unique(units[keep], return_inverse=True)
+        if len(codes) == 0:
+            return np.empty(0), np.empty(0), np.empty(0)
+
+        rng = np.random.RandomState([self.seed, i, j])
+        draws = rng.randint(0, len(codes), size=(n, len(codes)))
+        draws += len(codes) * np.arange(n)[:, np.newaxis]
+        counts = np.bincount(draws.ravel(), minlength=n * len(codes)).reshape(n, len(codes))
+
+        yy = np.broadcast_to(y, (n, len(y)))
+        params, cov, converged = fit_ellipses(x, yy, weights=counts[:, units], max_iter=self.max_iter)
+        return ellipse_shape(params[converged])
+
+
+def ellipse_bootstrap(points, n, orientation, alpha=0.05, seed=0, pool=None, chunk=250, max_iter=100):
+    """Bootstrap confidence intervals of ratio, eccentricity and orientation
+
+    points is a list of (x, y, units) arrays, one per group, and
+    orientation the fitted orientation of every group, the center of
+    its (circular, pi-periodic) interval. The n resamples of every
+    group are refitted in chunks of chunk resamples, in parallel if a
+    process pool is given. Returns the lower and upper bounds as
+    (groups, 3) arrays with the columns ratio, eccentricity and
+    orientation, and the number of converged resamples per group.
+    """
+    items = [(i, j, min(chunk, n - j * chunk)) + tuple(p)
+             for i, p in enumerate(points) for j in range((n + chunk - 1) // chunk)]
+    boot = EllipseBootstrap(seed, max_iter)
+    res = pool.map(boot, items) if pool is not None else [boot(t) for t in items]
+
+    lo = np.full((len(points), 3), np.nan)
+    hi = np.full((len(points), 3), np.nan)
+    used = np.zeros(len(points), dtype=np.int64)
+    parts = [[] for _ in points]
+    for t, r in zip(items, res):
+        parts[t[0]].append(r)
+    for i in range(len(points)):
+        ratio, eccentricity, orient = [np.concatenate([r[k] for r in parts[i]]) for k in range(3)]
+        used[i] = len(ratio)
+        if used[i] == 0:
+            continue
+        with np.errstate(invalid='ignore'):
+            lo[i, :2], hi[i, :2] = np.nanpercentile(np.stack([ratio, eccentricity], axis=-1),
+                                                    [50.0 * alpha, 100.0 - 50.0 * alpha], axis=0)
+        lo[i, 2], hi[i, 2] = circular_interval(orient, orientation[i], alpha)
+    return lo, hi, used
+
+
 def fit_ellipse(x, y):
-    # print('Fitting ellipse...', file=sys.stderr)
-    func = lambda param: to_fit_func(x, y, *list(param))
-    rx, cov_x, infodict, mesg, ier = scipy.optimize.leastsq(func, (10, 15, 20/180*np.pi), full_output=True)
-    if ier not in range(1, 5):
-        raise ArithmeticError(mesg)
-    return [i for i in rx]
+    params, cov, converged = fit_ellipses(x, y)
+    if not converged[0]:
+        raise ArithmeticError('ellipse fit did not converge')
+    return [i for i in params[0]]
+
 
 def get_parameters(params):
     a, b, phi = params[:]
     return [a, b], b, phi
 
+
 def create_ellipse(params, how_many):
     a, b, phi = params[:]
     x = np.linspace(0, 2*np.pi, how_many)
     y =  ellipse(a, b, phi, x)
     return x, y
-
@@ -1,17 +1,199 @@
 from __future__ import (absolute_import, division, print_function)
 
+import io
+import json
+import struct
 import sys
+import numpy as np
 import pandas as pd
 
+from colortilt.schema import apply_schema, is_trial_data, LABEL_SCHEMA, TRIAL_SCHEMA
 
-def read_data(file_list):
-    if len(file_list) == 1 and file_list[0] == '-':
-        file_list[0] = sys.stdin
 
-    df = pd.read_csv(file_list[0], skipinitialspace=True)
-    if len(file_list) > 1:
-        for data in file_list[1:]:
-            to_append = pd.read_csv(data, skipinitialspace=True)
-            df = df.append(to_append, ignore_index=True)
-    return df
+class CsvReader(object):
+    """Picklable csv reader, e.g. for multiprocessing.Pool.map"""
 
+    def __init__(self, reader=pd.read_csv, **kwargs):
+        self.reader = reader
+        self.kwargs = kwargs
+
+    def __call__(self, filename):
+        return self.reader(filename, **self.kwargs)
+
+
+def read_csv_files(file_list, dtype=None, prepare=None, reader=pd.read_csv, pool=None, exact=False):
+    """Read all csv files in file_list into a single DataFrame
+
+    All files are parsed first and then concatenated once, so the
+    loading time is linear in the number of files. If given, prepare
+    is called as prepare(filename, df) for every parsed file and must
+    return the (modified) frame. If a process pool is given, files are
+    parsed in parallel (the reader must be picklable then); the order
+    of the rows is the same as for the sequential case. With exact,
+    floats are parsed so that they round-trip, i.e. a frame written
+    with to_csv is read back unchanged (at about twice the cost).
+    """
+    kwargs = {'float_precision': 'round_trip'} if exact else {}
+    parse = CsvReader(reader, skipinitialspace=True, dtype=dtype, **kwargs)
+    frames = pool.map(parse, file_list) if pool is not None else map(parse, file_list)
+
+    if prepare is not None:
+        frames = [prepare(f, df) for f, df in zip(file_list, frames)]
+    else:
+        frames = list(frames)
+
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+# Binary stream format to pass frames between the ct-* tools:
+# BIN_MAGIC, the length of the json header (uint32, little endian), the
+# header and then the raw bytes of every column in the order of the
+# header. Strings and categoricals are stored as integer codes plus
+# the list of categories in the header; missing values have code -1.
+
+BIN_MAGIC = b'\x93CTBIN\x01\n'
+FORMATS = ['csv', 'bin']
+
+
+def binary_stream(fd):
+    """Return the binary stream underlying fd (i.e. sys.stdin/stdout on py3)"""
+    return getattr(fd, 'buffer', fd)
+
+
+def read_exact(fd, buf):
+    view = memoryview(buf)
+    pos = 0
+    while pos < len(view):
+        n = fd.readinto(view[pos:])
+        if not n:
+            raise ValueError('Truncated binary stream')
+        pos += n
+
+
+def encode_column(col):
+    if col.dtype.name == 'category':
+        codes = np.asarray(col.cat.codes)
+        cats = col.cat.categories
+        meta = {'kind': 'category', 'ordered': bool(col.cat.ordered)}
+    elif col.dtype.kind in 'biufcmM' and not hasattr(col.dtype, 'tz'):
+        data = np.ascontiguousarray(col)
+        return {'kind': 'array', 'dtype': data.dtype.str}, data
+    else:
+        codes, cats = pd.factorize(col)
+        meta = {'kind': 'object'}
+    codes = codes.astype(np.int8 if len(cats) < 128 else np.int16 if len(cats) < 2**15 else np.int32)
+    cats = np.asarray(cats, dtype=object)
+    meta['categories'] = [v.item() if isinstance(v, np.generic) else v for v in cats]
+    meta['dtype'] = codes.dtype.str
+    return meta, np.ascontiguousarray(codes)
+
+
+def decode_column(meta, data):
+    if meta['kind'] == 'array':
+        return data
+    cats = meta['categories']
+    if meta['kind'] == 'category':
+        return pd.Categorical.from_codes(data, cats, ordered=meta['ordered'])
+    values = np.empty(len(cats) + 1, dtype=object)
+    values[:-1] = cats
+    values[-1] = np.nan
+    return values[data]
+
+
+def write_bin(df, fd):
+    """Write df to the binary stream fd in the ct binary format"""
+    columns = [encode_column(df[name]) for name in df.columns]
+    header = {'rows': len(df),
+              'columns': [dict(meta, name=u'%s' % name)
+                          for name, (meta, _) in zip(df.columns, columns)]}
+    header = json.dumps(header, default=str).encode('utf-8')
+    fd.write(BIN_MAGIC)
+    fd.write(struct.pack('<I', len(header)))
+    fd.write(header)
+    for _, data in columns:
+        fd.write(memoryview(data.view(np.uint8)))
+    fd.flush()
+
+
+def read_bin(fd):
+    """Read a frame in the ct binary format from the binary stream fd"""
+    magic = fd.read(len(BIN_MAGIC))
+    if magic != BIN_MAGIC:
+        raise ValueError('Not a ct binary stream')
+    size, = struct.unpack('<I', fd.read(4))
+    header = json.loads(fd.read(size).decode('utf-8'))
+    rows = header['rows']
+    data = {}
+    for meta in header['columns']:
+        arr = np.empty(rows, dtype=np.dtype(str(meta['dtype'])))
+        read_exact(fd, arr.view(np.uint8))
+        data[meta['name']] = decode_column(meta, arr)
+    return pd.DataFrame(data, columns=[m['name'] for m in header['columns']])
+
+
+def data_format(fd):
+    """Sniff the format of the seekable binary file object fd"""
+    pos = fd.tell()
+    fmt = 'bin' if fd.read(len(BIN_MAGIC)) == BIN_MAGIC else 'csv'
+    fd.seek(pos)
+    return fmt
+
+
+def typed_frame(df, categorical=False):
+    """Apply the compact trial schema to trial data only
+
+    Derived tables (e.g. the means of ct-ana) keep their float64
+    values, only their label columns are converted.
+    """
+    schema = TRIAL_SCHEMA if is_trial_data(df) else LABEL_SCHEMA
+    return apply_schema(df, schema=schema, categorical=categorical)
+
+
+def read_data(file_list, dtype=None, pool=None, categorical=False):
+    """Read csv or binary data from the files in file_list ('-' is stdin)
+
+    The format of every file is detected from its first bytes, binary
+    data keeps its dtypes and is not parsed at all. Stdin cannot be
+    rewound, so it is read completely before sniffing. Csv floats are
+    parsed exactly, so the tools see the same values as in-process
+    (ct-run); see typed_frame for the dtypes of the result.
+    """
+    sources = []
+    for f in file_list:
+        if f == '-':
+            fd = io.BytesIO(binary_stream(sys.stdin).read())
+        else:
+            fd = open(f, 'rb')
+        sources.append((f, fd, data_format(fd)))
+
+    if all(fmt == 'csv' and f != '-' for f, _, fmt in sources):
+        for _, fd, _ in sources:
+            fd.close()
+        df = read_csv_files(file_list, dtype=dtype, pool=pool, exact=True)
+        return typed_frame(df, categorical=categorical)
+
+    frames = []
+    for _, fd, fmt in sources:
+        with fd:
+            if fmt == 'bin':
+                frames.append(read_bin(fd))
+            else:
+                frames.append(read_csv_files([fd], dtype=dtype, exact=True))
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return typed_frame(df, categorical=categorical)
+
+
+def write_data(df, output='-', fmt='csv'):
+    """Write df as csv or in the binary format to output ('-' is stdout)"""
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format: %s' % fmt)
+    if fmt == 'csv':
+        df.to_csv(sys.stdout if output == '-' else output, index=False)
+    elif output == '-':
+        sys.stdout.flush()
+        write_bin(df, binary_stream(sys.stdout))
+    else:
+        with open(output, 'wb') as fd:
+            write_bin(df, fd)
@@ -0,0 +1,83 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import hashlib
+import pandas as pd
+
+
+def file_digest(filename):
+    """Return the sha1 hex digest and the number of data rows of a csv file"""
+    with open(filename, 'rb') as fd:
+        content = fd.read()
+    lines = [l for l in content.splitlines() if l.strip()]
+    return hashlib.sha1(content).hexdigest(), max(len(lines) - 1, 0)
+
+
+class Manifest(object):
+    """Record of all result files that have been ingested
+
+    For every file the subject, the path relative to the data directory,
+    size, modification time, sha1 and the number of trials are stored.
+    The manifest is kept as a csv file (by default beside the experiment
+    file) and allows to find the files that are new since the last run.
+    """
+
+    columns = ['subject', 'file', 'size', 'mtime', 'sha1', 'rows']
+
+    def __init__(self, path, datapath):
+        self.path = path
+        self.datapath = datapath
+        self.entries = {}
+        if os.path.exists(path):
+            df = pd.read_csv(path, dtype={'subject': str, 'file': str, 'sha1': str})
+            for row in df.itertuples(index=False):
+                self.entries[row.file] = dict(zip(self.columns, row))
+
+    def key(self, filename):
+        return os.path.relpath(os.path.abspath(filename), os.path.abspath(self.datapath))
+
+    def __contains__(self, filename):
+        return self.key(filename) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_unchanged(self, filename):
+        entry = self.entries[self.key(filename)]
+        st = os.stat(filename)
+        if st.st_size == entry['size'] and st.st_mtime == entry['mtime']:
+            return True
+        sha1, _ = file_digest(filename)
+        if sha1 != entry['sha1']:
+            return False
+        # touched, but the same content
+        entry['mtime'] = st.st_mtime
+        return True
+
+    def check(self, subject, file_list):
+        """Split file_list into new files and already ingested ones that changed
+
+        Ingested files of the subject that are no longer in file_list
+        are reported as changed, too.
+        """
+        new = [f for f in file_list if f not in self]
+        changed = [f for f in file_list if f in self and not self.is_unchanged(f)]
+        present = set(self.key(f) for f in file_list)
+        gone = [os.path.join(self.datapath, k) for k, e in sorted(self.entries.items())
+                if e['subject'] == subject and k not in present]
+        return new, changed + gone
+
+    def add(self, subject, filename):
+        st = os.stat(filename)
+        sha1, rows = file_digest(filename)
+        entry = {'subject': subject, 'file': self.key(filename),
+                 'size': st.st_size, 'mtime': st.st_mtime, 'sha1': sha1, 'rows': rows}
+        self.entries[entry['file']] = entry
+        return entry
+
+    def save(self):
+        rows = [self.entries[k] for k in sorted(self.entries)]
+        df = pd.DataFrame(rows, columns=self.columns)
+        tmp = self.path + '.tmp'
+        df.to_csv(tmp, index=False)
+        os.rename(tmp, self.path)
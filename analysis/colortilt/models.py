@@ -0,0 +1,242 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+
+# Parametric models of the induction curves, i.e. the shift over the
+# foreground hue relative to the background (in degrees), and a batched
+# least squares solver that fits a model to many curves at once.
+
+
+def least_squares(f, jac, x, y, p0, weights=None, max_iter=100, tol=1e-10):
+    """Levenberg-Marquardt fit of y = f(p, x) to every row of y at once
+
+    y is a (fits, points) array, NaN for missing points, x has one
+    value per point or the shape of y and p0 holds the (fits, params)
+    start values. f(p, x) returns the (fits, points) model values and
+    jac(p, x) their (fits, points, params) derivatives. Weights count
+    how often a point is taken (or are 1/err**2); points with weight 0
+    are left out. A fit has converged when an accepted step reduces
+    the sum of squares or changes the parameters by less than the
+    relative tolerance tol.
+
+    Returns the parameters, their covariance, scaled by the residual
+    variance like scipy.optimize.curve_fit (NaN without degrees of
+    freedom), whether the fit converged, the weighted residual sum of
+    squares and the number of points of every fit.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    x = np.broadcast_to(np.asarray(x, dtype=np.float64), y.shape)
+    w = np.ones(y.shape) if weights is None else np.asarray(weights, dtype=np.float64)
+    w = np.where(np.isfinite(y) & np.isfinite(x) & (w > 0), w, 0.0)
+    x, y, sw = np.where(w > 0, x, 0.0), np.where(w > 0, y, 0.0), np.sqrt(w)
+    n = np.sum(w > 0, axis=1)
+    p = np.array(np.broadcast_to(np.asarray(p0, dtype=np.float64), (len(y), np.shape(p0)[-1])))
+    k = p.shape[1]
+
+    def residuals(p, x, y, sw):
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            r = y - f(p, x)
+        return np.where(sw > 0, sw * r, 0.0)
+
+    def jacobian(p, x, sw):
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            J = jac(p, x)
+        return np.where((sw > 0)[..., np.newaxis], J * sw[..., np.newaxis], 0.0)
+
+    r = residuals(p, x, y, sw)
+    cost = np.sum(r*r, axis=1)
+    lam = np.full(len(y), 1e-3)
+    converged = cost == 0
+    failed = n < k
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(~converged & ~failed)
+        if len(idx) == 0:
+            break
+        pk, xk, yk, wk = p[idx], x[idx], y[idx], sw[idx]
+        J = jacobian(pk, xk, wk)
+        Jt = J.transpose(0, 2, 1)
+        A = np.matmul(Jt, J)
+        g = np.matmul(Jt, r[idx][..., np.newaxis])[..., 0]
+
+        d = np.diagonal(A, axis1=1, axis2=2)
+        d = np.maximum(d, 1e-12 * np.maximum(d.max(axis=1, keepdims=True), 1e-300))
+        M = A + (lam[idx, np.newaxis] * d)[..., np.newaxis] * np.eye(k)
+        ok = np.all(np.isfinite(M), axis=(1, 2)) & np.all(np.isfinite(g), axis=1)
+        step = np.zeros_like(g)
+        step[ok] = np.linalg.solve(M[ok], g[ok][..., np.newaxis])[..., 0]
+
+        pn = pk + step
+        rn = residuals(pn, xk, yk, wk)
+        cn = np.sum(rn*rn, axis=1)
+        better = ok & np.isfinite(cn) & (cn <= cost[idx])
+
+        small = ((cost[idx] - cn <= tol * cost[idx]) |
+                 (np.sqrt(np.sum(step*step, axis=1)) <= tol * (np.sqrt(np.sum(pk*pk, axis=1)) + tol)))
+        converged[idx] = better & small
+        failed[idx] = ~ok | (lam[idx] > 1e16)
+
+        acc = idx[better]
+        p[acc], r[acc], cost[acc] = pn[better], rn[better], cn[better]
+        lam[idx] = np.where(better, lam[idx] * 0.1, lam[idx] * 10.0)
+
+    J = jacobian(p, x, sw)
+    A = np.matmul(J.transpose(0, 2, 1), J)
+    fine = np.all(np.isfinite(A), axis=(1, 2))
+    cov = np.full(A.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s2 = np.where(n > k, cost / (w.sum(axis=1) - k), np.nan)
+        cov[fine] = np.linalg.pinv(A[fine]) * s2[fine, np.newaxis, np.newaxis]
+    return p, cov, converged, cost, n
+
+
+def linear_fit(X, y, w):
+    """Weighted linear least squares for every fit, X is (fits, points, params)
+
+    A tiny ridge keeps the normal equations solvable for fits with too
+    few points; their coefficients are then close to 0.
+    """
+    Xt = (X * w[..., np.newaxis]).transpose(0, 2, 1)
+    A = np.matmul(Xt, X)
+    g = np.matmul(Xt, y[..., np.newaxis])
+    ridge = 1e-12 * np.trace(A, axis1=1, axis2=2) + 1e-300
+    A += ridge[:, np.newaxis, np.newaxis] * np.eye(A.shape[-1])
+    return np.linalg.solve(A, g)[..., 0]
+
+
+def wrap(d):
+    """Angle differences in degrees wrapped to [-180, 180)"""
+    return d - 360.0 * np.floor((d + 180.0) / 360.0)
+
+
+class DerivativeOfGaussian(object):
+    """First derivative of a Gaussian over the relative foreground hue
+
+    y = offset + amplitude * sqrt(e) * u * exp(-u**2 / 2) with
+    u = (x - center) / width, i.e. the curve is zero at center and
+    has its extrema, +-amplitude, at center +- width.
+    """
+
+    name = 'dog'
+    params = ['amplitude', 'center', 'width', 'offset']
+    centers = [-30.0, -15.0, 0.0, 15.0, 30.0]
+    widths = [15.0, 22.5, 30.0, 45.0, 60.0, 90.0]
+
+    @staticmethod
+    def shape(x, center, width):
+        u = wrap(x - center) / width
+        return np.sqrt(np.e) * u * np.exp(-u*u / 2.0), u
+
+    def __call__(self, p, x):
+        g, _ = self.shape(x, p[:, 1:2], p[:, 2:3])
+        return p[:, 3:4] + p[:, 0:1] * g
+
+    def jacobian(self, p, x):
+        amplitude, width = p[:, 0:1], p[:, 2:3]
+        g, u = self.shape(x, p[:, 1:2], width)
+        dg = np.sqrt(np.e) * (1.0 - u*u) * np.exp(-u*u / 2.0)
+        return np.stack([g, -amplitude * dg / width, -amplitude * dg * u / width,
+                         np.ones_like(g)], axis=-1)
+
+    def initial(self, x, y, w):
+        """Best amplitude and offset (linear) on a grid of centers and widths"""
+        best = np.full(len(y), np.inf)
+        p0 = np.zeros((len(y), 4))
+        p0[:, 2] = 30.0
+        for center in self.centers:
+            for width in self.widths:
+                g, _ = self.shape(x, center, width)
+                X = np.stack([g, np.ones_like(g)], axis=-1)
+                with np.errstate(invalid='ignore'):
+                    coef = linear_fit(X, y, w)
+                    r = y - np.einsum('kpi,ki->kp', X, coef)
+                    cost = np.sum(w * r * r, axis=1)
+                take = cost < best
+                best[take] = cost[take]
+                p0[take] = np.stack([coef[take, 0], np.full(take.sum(), center),
+                                     np.full(take.sum(), width), coef[take, 1]], axis=-1)
+        return p0
+
+    def canonical(self, p):
+        """Same curves with positive width and center in [-180, 180)"""
+        sign = np.where(p[:, 2] < 0, -1.0, 1.0)
+        p = p * np.stack([sign, np.ones(len(p)), sign, np.ones(len(p))], axis=-1)
+        p[:, 1] = wrap(p[:, 1])
+        return p
+
+
+class Sinusoids(object):
+    """Sum of sinusoids over the relative foreground hue
+
+    y = offset + sum_k sin_k * sin(k x) + cos_k * cos(k x) for the
+    harmonics k = 1 .. harmonics. The model is linear, so the start
+    values already are the least squares solution.
+    """
+
+    name = 'sin'
+
+    def __init__(self, harmonics=2):
+        self.harmonics = harmonics
+        self.params = ['offset'] + ['%s%d' % (f, k) for k in range(1, harmonics + 1) for f in ['sin', 'cos']]
+
+    def design(self, x):
+        x = np.asarray(x) / 180.0 * np.pi
+        cols = [np.ones_like(x)]
+        for k in range(1, self.harmonics + 1):
+            cols += [np.sin(k * x), np.cos(k * x)]
+        return np.stack(cols, axis=-1)
+
+    def __call__(self, p, x):
+        return np.einsum('kpi,ki->kp', self.design(np.broadcast_to(x, (len(p),) + np.shape(x)[-1:])), p)
+
+    def jacobian(self, p, x):
+        return self.design(np.broadcast_to(x, (len(p),) + np.shape(x)[-1:]))
+
+    def initial(self, x, y, w):
+        return linear_fit(self.design(x), y, w)
+
+    def canonical(self, p):
+        return p
+
+
+MODELS = {'dog': DerivativeOfGaussian, 'sin': Sinusoids}
+
+
+def make_model(name, harmonics=2):
+    if name == 'sin':
+        return Sinusoids(harmonics)
+    return MODELS[name]()
+
+
+def fit_curves(model, x, y, weights=None, max_iter=100):
+    """Fit the model to every row of y (curves x points, NaN where missing)
+
+    Returns the parameters, their standard errors, whether the fit
+    converged and the goodness of fit as a dict of arrays: the
+    weighted residual sum of squares (rss), the coefficient of
+    determination (r2), the root mean squared residual (rmse) and
+    Akaike's information criterion (aic).
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    x = np.broadcast_to(np.asarray(x, dtype=np.float64), y.shape)
+    w = np.ones(y.shape) if weights is None else np.asarray(weights, dtype=np.float64)
+    w = np.where(np.isfinite(y) & np.isfinite(x) & (w > 0), w, 0.0)
+    xs, ys = np.where(w > 0, x, 0.0), np.where(w > 0, y, 0.0)
+
+    p0 = model.initial(xs, ys, w)
+    p, cov, converged, rss, n = least_squares(model, model.jacobian, x, y, p0, weights=w,
+                                              max_iter=max_iter)
+
+    p = model.canonical(p)
+    k = len(model.params)
+    sw = w.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.sum(w * ys, axis=1) / sw
+        tss = np.sum(w * (ys - mean[:, np.newaxis])**2, axis=1)
+        gof = {'rss': rss,
+               'r2': 1.0 - rss / tss,
+               'rmse': np.sqrt(rss / sw),
+               'aic': n * np.log(rss / n) + 2 * k}
+        err = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+    return p, err, converged, gof
@@ -0,0 +1,138 @@
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import itertools
+import os
+import sys
+
+from colortilt.tools.stream import read_arguments, read, write_arguments, write
+from colortilt.tools.load import load_arguments, load
+from colortilt.tools.filter import filter_arguments, filter_data
+from colortilt.tools.ana import ana_arguments, analyse
+from colortilt.tools.conv import conv_arguments, convert
+from colortilt.tools.chi2 import chi2_arguments, chi2_sizes
+from colortilt.tools.cmpold import cmpold_arguments, compare_old
+from colortilt.tools.spread import spread_arguments, spread
+from colortilt.tools.slope import slope_arguments, slope
+from colortilt.tools.ellipse import ellipse_arguments, fit_ellipse_groups
+from colortilt.tools.fit import fit_arguments, fit_models
+from colortilt.tools.szdiff import szdiff_arguments, size_diff
+from colortilt.tools.sizerel import sizerel_arguments, sizerel
+from colortilt.tools.scat import scat
+
+
+# The data transformations of the ct-* tools, so that they can be chained
+# in one process (see Pipeline and ct-run.py) instead of passing csv
+# through pipes. Every tool has a function to add its command line
+# arguments to a parser and a function df = f(df, args) doing the work,
+# see the modules of colortilt.tools.
+
+
+class Stage(object):
+    def __init__(self, name, run, configure=None, help=None, source=False, sink=False):
+        self.name = name
+        self.run = run
+        self.configure = configure
+        self.help = help
+        self.source = source
+        self.sink = sink
+
+    def parse_args(self, argv):
+        parser = argparse.ArgumentParser(prog=self.name, description=self.help)
+        if self.configure is not None:
+            self.configure(parser)
+        return parser.parse_args(argv)
+
+
+STAGES = {}
+
+
+def register(name, run, configure=None, help=None, source=False, sink=False):
+    STAGES[name] = Stage(name, run, configure, help=help, source=source, sink=sink)
+    return STAGES[name]
+
+
+# directory of the ct-*.py tools
+TOOLS_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_source(name, path):
+    """Import the python file path as module name (and add it to sys.modules)"""
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    # registered before running it, so that its classes can be pickled
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def load_tool(name):
+    """The module of the tool ct-NAME.py, imported as ct_NAME"""
+    module = 'ct_' + name.replace('-', '_')
+    if module in sys.modules:
+        return sys.modules[module]
+    return load_source(module, os.path.join(TOOLS_PATH, 'ct-%s.py' % name))
+
+
+def register_plot():
+    """Register the plot stage; ct-plot (and with it matplotlib) is only loaded when it runs"""
+    run = lambda df, args: load_tool('plot').plot(df, args)
+    configure = lambda parser: load_tool('plot').plot_arguments(parser)
+    register('plot', run, configure, help='plot the data', sink=True)
+
+
+class Pipeline(object):
+    """A chain of stages that pass a DataFrame from one to the next"""
+
+    separator = '|'
+
+    def __init__(self):
+        self.steps = []
+
+    def add(self, name, argv=None):
+        if name not in STAGES:
+            raise ValueError('Unknown stage: %s' % name)
+        stage = STAGES[name]
+        self.steps.append((stage, stage.parse_args(list(argv or []))))
+        return self
+
+    @staticmethod
+    def from_args(argv):
+        pipeline = Pipeline()
+        for is_sep, tokens in itertools.groupby(argv, lambda x: x == Pipeline.separator):
+            if is_sep:
+                continue
+            tokens = list(tokens)
+            pipeline.add(tokens[0], tokens[1:])
+        return pipeline
+
+    def __call__(self, df=None):
+        for stage, args in self.steps:
+            df = stage.run(df, args)
+        return df
+
+
+register('read', read, read_arguments, help='read csv data', source=True)
+register('write', write, write_arguments, help='write csv data', sink=True)
+register('load', load, load_arguments, help='load experiment data', source=True)
+register('filter', filter_data, filter_arguments, help='filter trials')
+register('ana', analyse, ana_arguments, help='mean and error of the shifts')
+register('conv', convert, conv_arguments, help='convert data')
+register('chi2', chi2_sizes, chi2_arguments, help='compare sizes via chi-squared')
+register('cmpold', compare_old, cmpold_arguments, help='compare with the old data set')
+register('spread', spread, spread_arguments, help='spread over sizes')
+register('slope', slope, slope_arguments, help='slope of the induction over size')
+register('ellipse', fit_ellipse_groups, ellipse_arguments, help='fit ellipses to the spread')
+register('fit', fit_models, fit_arguments, help='fit induction models to the curves')
+register('szdiff', size_diff, szdiff_arguments, help='size differences')
+register('sizerel', sizerel, sizerel_arguments, help='size relation')
+register('scat', scat, help='delta vs. 40')
@@ -0,0 +1,71 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+
+# canonical columns of trial data with compact dtypes
+TRIAL_SCHEMA = {
+    'subject': 'category',
+    'side': 'category',
+    'size': np.int16,
+    'bg': np.float32,
+    'fg': np.float32,
+    'fg_abs': np.float32,
+    'phi': np.float32,
+    'phi_start': np.float32,
+    'shift': np.float32,
+    'duration': np.float32,
+    'date': 'datetime64[ns]'
+}
+
+# the label columns of TRIAL_SCHEMA, the only ones converted in derived tables
+LABEL_SCHEMA = {k: v for k, v in TRIAL_SCHEMA.items() if v == 'category'}
+
+# columns that only trial data (ct-load output, also filtered) has
+TRIAL_COLUMNS = ['phi']
+
+# dtypes used when parsing the raw result files (*.dat)
+RESULT_COLUMNS = ['size', 'bg', 'fg', 'phi_start', 'phi', 'side', 'duration']
+RESULT_DTYPES = {k: (str if TRIAL_SCHEMA[k] == 'category' else TRIAL_SCHEMA[k]) for k in RESULT_COLUMNS}
+
+
+def convert_column(col, dtype):
+    if dtype == 'category':
+        return col.astype('category')
+    elif dtype == 'datetime64[ns]':
+        return pd.to_datetime(col)
+
+    converted = col.astype(dtype)
+    if np.issubdtype(np.dtype(dtype), np.integer) and not (converted == col).all():
+        raise ValueError('Column not integral')
+    return converted
+
+
+def is_trial_data(df):
+    return all(c in df.columns for c in TRIAL_COLUMNS)
+
+
+def apply_schema(df, schema=None, categorical=True):
+    """Convert all columns of df that are in schema to their compact dtype
+
+    Columns that cannot be converted without loss (e.g. sizes with
+    missing values) are left as they are. Categorical columns can be
+    skipped, since grouping by several categorical columns also yields
+    the unobserved combinations in the pandas versions we support; they
+    are converted back to plain strings if they are categorical already.
+    """
+    schema = schema or TRIAL_SCHEMA
+    for name in df.columns:
+        dtype = schema.get(name)
+        if dtype == 'category' and not categorical:
+            if df[name].dtype.name == 'category':
+                df[name] = np.asarray(df[name], dtype=object)
+            continue
+        elif dtype is None:
+            continue
+        try:
+            df[name] = convert_column(df[name], dtype)
+        except (ValueError, TypeError, OverflowError):
+            pass
+    return df
@@ -0,0 +1,267 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.core import GroupedData
+
+
+def segment_sum(values, offsets):
+    if len(offsets) < 2:
+        return np.array([], dtype=values.dtype)
+    return np.add.reduceat(values, offsets[:-1])
+
+
+def group_stats(df, groups, col, ddof=1):
+    """Count, mean, standard deviation and standard error of col per group
+
+    All groups are computed at once on the column sorted by group (see
+    GroupedData). Only finite values are taken into account (NaN and
+    inf are ignored); mean, std and sem are NaN for groups that have
+    too few finite values, like numpy and scipy.stats.sem would return.
+    The result has one row per group, sorted like DataFrame.groupby,
+    with the group columns followed by N, mean, std and sem.
+    """
+    gd = GroupedData(df, groups)
+    values = gd.column(col).astype(np.float64)
+    finite = np.isfinite(values)
+    values = np.where(finite, values, 0.0)
+
+    n = segment_sum(finite.astype(np.int64), gd.offsets)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = segment_sum(values, gd.offsets) / n
+        delta = np.where(finite, values - np.repeat(mean, gd.sizes), 0.0)
+        dof = np.where(n - ddof > 0, n - ddof, np.nan)
+        var = segment_sum(delta * delta, gd.offsets) / dof
+        std = np.sqrt(var)
+        sem = np.sqrt(var / n)
+
+    data = {name: gd.key_column(name) for name in groups}
+    data.update({'N': n, 'mean': mean, 'std': std, 'sem': sem})
+    return pd.DataFrame(data, columns=list(groups) + ['N', 'mean', 'std', 'sem'])
+
+
+def bootstrap_means(values, n, rng):
+    """Means of n resamples of values, drawn as one (n, len(values)) index matrix"""
+    idx = rng.randint(0, len(values), size=(n, len(values)))
+    return values[idx].mean(axis=1)
+
+
+def percentile_interval(values, means, alpha):
+    return np.percentile(means, [50.0 * alpha, 100.0 - 50.0 * alpha])
+
+
+def bca_interval(values, means, alpha):
+    """Bias-corrected and accelerated interval (Efron & Tibshirani, ch. 14.3)"""
+    from scipy.special import ndtr, ndtri
+
+    n = len(means)
+    theta = values.mean()
+    p = (np.sum(means < theta) + 0.5 * np.sum(means == theta)) / n
+    z0 = ndtri(np.clip(p, 0.5 / n, 1.0 - 0.5 / n))
+
+    # acceleration from the jackknife means
+    jack = (values.sum() - values) / (len(values) - 1)
+    d = jack.mean() - jack
+    den = 6.0 * np.sum(d * d) ** 1.5
+    a = np.sum(d * d * d) / den if den > 0 else 0.0
+
+    z = ndtri([alpha / 2.0, 1.0 - alpha / 2.0])
+    q = ndtr(z0 + (z0 + z) / (1.0 - a * (z0 + z)))
+    return np.percentile(means, 100.0 * q)
+
+
+CI_METHODS = {'percentile': percentile_interval, 'bca': bca_interval}
+
+
+class Bootstrap(object):
+    """Picklable bootstrap of the mean of one group, e.g. for multiprocessing.Pool.map
+
+    Called with (i, values) it returns the confidence interval of the
+    mean of the finite values. Every group draws from its own random
+    stream seeded with (seed, i), so the result does not depend on how
+    the groups are distributed over processes.
+    """
+
+    def __init__(self, n, alpha=0.05, method='bca', seed=0):
+        self.n = n
+        self.alpha = alpha
+        self.method = method
+        self.seed = seed
+
+    def __call__(self, item):
+        i, values = item
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return np.nan, np.nan
+        elif len(values) == 1:
+            return values[0], values[0]
+        rng = np.random.RandomState([self.seed, i])
+        means = bootstrap_means(values, self.n, rng)
+        lo, hi = CI_METHODS[self.method](values, means, self.alpha)
+        return lo, hi
+
+
+def group_bootstrap(df, groups, col, n, alpha=0.05, method='bca', seed=0, pool=None):
+    """Bootstrap confidence intervals of the mean of col for every group
+
+    Returns the lower and upper bounds as arrays in the order of the
+    rows of group_stats. If a process pool is given, the groups are
+    resampled in parallel.
+    """
+    gd = GroupedData(df, groups)
+    if len(gd) == 0:
+        return np.array([]), np.array([])
+    values = gd.column(col).astype(np.float64)
+    cells = list(enumerate(np.split(values, gd.offsets[1:-1])))
+    boot = Bootstrap(n, alpha, method, seed)
+    if pool is not None:
+        ci = pool.map(boot, cells)
+    else:
+        ci = [boot(c) for c in cells]
+    ci = np.array(ci, dtype=np.float64)
+    return ci[:, 0], ci[:, 1]
+
+
+def welch_chi2(x, labels, offsets):
+    """Sum over the strata of the squared, standardized difference of two means
+
+    x are the values sorted by stratum, stratum k is x[offsets[k]:offsets[k+1]];
+    labels is a (permutations, len(x)) boolean array, True for sample a.
+    Like the chi-squared of the mean curves, but with the standard
+    errors of the two samples of every permutation.
+    """
+    la = labels.astype(np.float64)
+    lb = 1.0 - la
+    starts = offsets[:-1]
+    na = np.add.reduceat(la, starts, axis=1)
+    nb = np.add.reduceat(lb, starts, axis=1)
+    sa = np.add.reduceat(la * x, starts, axis=1)
+    sb = np.add.reduceat(lb * x, starts, axis=1)
+    qa = np.add.reduceat(la * x * x, starts, axis=1)
+    qb = np.add.reduceat(lb * x * x, starts, axis=1)
+    ma, mb = sa / na, sb / nb
+    va = (qa - na * ma * ma) / (na - 1)
+    vb = (qb - nb * mb * mb) / (nb - 1)
+    den = va / na + vb / nb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = np.where(den > 0, (ma - mb)**2 / den, 0.0)
+    return r.sum(axis=1)
+
+
+class PermutationTest(object):
+    """Picklable permutation test of two samples, e.g. for multiprocessing.Pool.map
+
+    Called with (i, values, labels, strata) it tests if the values with
+    label True differ from the rest via welch_chi2, where the labels are
+    shuffled within every stratum (i.e. foreground hue). Permutations
+    are drawn in batches from a random stream seeded with (seed, i);
+    sampling stops early once the confidence interval of the p-value
+    lies entirely below or above alpha. Strata with less than two
+    values of either sample are ignored. Returns the statistic, the
+    p-value (k + 1) / (n + 1) for k of n permutations with a statistic
+    at least as large, n and the number of strata used.
+    """
+
+    def __init__(self, n, alpha=0.01, seed=0, batch=1000, confidence=0.999):
+        self.n = n
+        self.alpha = alpha
+        self.seed = seed
+        self.batch = batch
+        self.confidence = confidence
+
+    def decided(self, k, n):
+        from scipy.stats import beta
+
+        q = (1.0 - self.confidence) / 2.0
+        lower = beta.ppf(q, k, n - k + 1) if k > 0 else 0.0
+        upper = beta.ppf(1.0 - q, k + 1, n - k) if k < n else 1.0
+        return upper < self.alpha or lower > self.alpha
+
+    def __call__(self, item):
+        i, values, labels, strata = item
+        keep = np.isfinite(values)
+        values, labels, strata = values[keep], labels[keep].astype(bool), strata[keep]
+
+        # only strata with at least two values of both samples
+        codes, strata = np.unique(strata, return_inverse=True)
+        na = np.bincount(strata, weights=labels, minlength=len(codes))
+        nb = np.bincount(strata, weights=~labels, minlength=len(codes))
+        ok = (na >= 2) & (nb >= 2)
+        if not ok.any():
+            return np.nan, np.nan, 0, 0
+        used = np.flatnonzero(ok)
+        keep = ok[strata]
+
+        order = np.argsort(strata[keep], kind='mergesort')
+        strata = np.searchsorted(used, strata[keep][order])
+        labels = labels[keep][order]
+        x = values[keep][order]
+        offsets = np.concatenate(([0], np.flatnonzero(np.diff(strata)) + 1, [len(x)]))
+        # the statistic does not change if every stratum is shifted
+        x = x - np.repeat(np.add.reduceat(x, offsets[:-1]) / np.diff(offsets), np.diff(offsets))
+
+        stat = welch_chi2(x, labels[np.newaxis, :], offsets)[0]
+        tol = 1e-9 * max(abs(stat), 1.0)
+
+        rng = np.random.RandomState([self.seed, i])
+        k = n = 0
+        while n < self.n:
+            size = min(self.batch, self.n - n)
+            perm = np.argsort(strata + rng.random_sample((size, len(x))), axis=1)
+            k += np.sum(welch_chi2(x, labels[perm], offsets) >= stat - tol)
+            n += size
+            if self.decided(k, n):
+                break
+        return stat, (k + 1.0) / (n + 1.0), n, len(used)
+
+
+def permutation_tests(tests, n, alpha=0.01, seed=0, pool=None):
+    """Run PermutationTest for a list of (values, labels, strata) tuples
+
+    Returns the statistic, p-value, number of permutations and number
+    of strata as arrays with one entry per test.
+    """
+    test = PermutationTest(n, alpha=alpha, seed=seed)
+    items = [(i,) + tuple(t) for i, t in enumerate(tests)]
+    res = pool.map(test, items) if pool is not None else [test(t) for t in items]
+    res = np.array(res, dtype=np.float64).reshape(-1, 4)
+    return res[:, 0], res[:, 1], res[:, 2].astype(np.int64), res[:, 3].astype(np.int64)
+
+
+def weighted_linear_fit(x, y, w):
+    """Closed-form weighted least squares fit of y = intercept + slope * x
+
+    Fits every row of y (groups x points) at once; x has one value per
+    point and w holds the weight of every point of every group, 0 for
+    points that are missing. The weights are taken as relative, i.e.
+    the standard error of the slope is scaled by the residual variance
+    (for equal weights it is the one of ordinary least squares). The
+    p-value is the two-sided t-test for a slope of zero; standard error
+    and p-value are NaN for groups with less than three points.
+    Returns slope, intercept, standard error, p-value and number of
+    points as arrays with one value per group.
+    """
+    from scipy.stats import t
+
+    x = np.asarray(x, dtype=np.float64)[np.newaxis, :]
+    w = np.where(np.isfinite(y) & (w > 0), w, 0.0)
+    y = np.where(w > 0, y, 0.0)
+    n = np.sum(w > 0, axis=1)
+
+    sw = w.sum(axis=1)
+    sx = (w * x).sum(axis=1)
+    sy = (w * y).sum(axis=1)
+    sxx = (w * x * x).sum(axis=1)
+    sxy = (w * x * y).sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = sw * sxx - sx * sx
+        slope = (sw * sxy - sx * sy) / delta
+        intercept = (sy - slope * sx) / sw
+        res = y - intercept[:, np.newaxis] - slope[:, np.newaxis] * x
+        rss = (w * res * res).sum(axis=1)
+        dof = np.where(n > 2, n - 2, np.nan)
+        se = np.sqrt(rss / dof * sw / delta)
+        p = 2.0 * t.sf(np.abs(slope / se), dof)
+    return slope, intercept, se, p, n
@@ -11,10 +11,7 @@ def size_colors_seq_bmr(size):
         '160': [244, 60, 103, 255]    # red
     }
 
-    for k, v in cs_map.iteritems():
-        cs_map[k] = map(lambda x: x/255.0, v)
-
-    return cs_map[str(size)]
+    return [x/255.0 for x in cs_map[str(size)]]
 
 
 def size_colors_ck01(size):
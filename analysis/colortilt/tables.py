@@ -0,0 +1,68 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+from colortilt.core import GroupedData, factorize
+
+
+# Dense tables of the values of a column for every group, e.g. the shift
+# over the sizes, to compute over all groups at once.
+
+
+def position_table(df, groups, column, values=None):
+    """Row positions of df as dense (group, value of column) array
+
+    Returns the grouping, the values of column (all values in df, if
+    values is None) and the array, which is -1 where a group has no
+    row for a value.
+    """
+    gd = GroupedData(df, groups)
+    uniques, c = factorize(df[column])
+    values = uniques if values is None else np.asarray(sorted(values))
+    k = np.searchsorted(values, uniques)
+    found = (k < len(values)) & (values[np.minimum(k, len(values) - 1)] == uniques)
+    k = np.where(found, k, -1)[c]
+    rows = np.flatnonzero((gd.row_group >= 0) & (c >= 0) & (k >= 0))
+
+    table = np.full((len(gd), len(values)), -1, dtype=np.int64)
+    table[gd.row_group[rows], k[rows]] = rows
+    return gd, values, table
+
+
+def value_table(df, groups, column, col, values=None):
+    """Values of col as dense (group, value of column) array, NaN where missing"""
+    gd, values, pos = position_table(df, groups, column, values)
+    data = np.append(np.asarray(df[col], dtype=np.float64), np.nan)
+    return gd, values, data[pos]
+
+
+def size_table(df, groups, col, sizes=None):
+    return value_table(df, groups, 'size', col, sizes)
+
+
+def size_column(sizes, table, size):
+    """The column of a (group, size) table for size, NaN if it is not there"""
+    k = np.flatnonzero(sizes == size)
+    return table[:, k[0]] if len(k) else np.full(len(table), np.nan)
+
+
+def group_points(df, groups, cols):
+    """Values of cols as dense (group, row within group) arrays, NaN padded
+
+    Without groups, all rows are one group. Returns the grouping (None
+    without groups) and one array per column.
+    """
+    if groups:
+        gd = GroupedData(df, groups)
+        order, offsets = gd.order, gd.offsets
+    else:
+        gd, order, offsets = None, np.arange(len(df)), np.array([0, len(df)])
+    sizes = np.diff(offsets)
+    row = np.repeat(np.arange(len(sizes)), sizes)
+    pos = np.arange(len(order)) - np.repeat(offsets[:-1], sizes)
+    tables = []
+    for col in cols:
+        table = np.full((len(sizes), sizes.max() if len(sizes) else 0), np.nan)
+        table[row, pos] = np.asarray(df[col], dtype=np.float64)[order]
+        tables.append(table)
+    return gd, tables
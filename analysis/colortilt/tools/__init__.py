@@ -0,0 +1,5 @@
+from __future__ import (absolute_import, division, print_function)
+
+# The ct-* tools, one module each: a function that adds the command line
+# arguments of the tool to a parser and a function df = f(df, args) that
+# does the work. colortilt.pipeline registers them as stages.
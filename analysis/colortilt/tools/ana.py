@@ -0,0 +1,75 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+from colortilt.stats import group_stats, group_bootstrap, CI_METHODS
+from colortilt.core import make_pool
+
+
+# ct-ana: mean and error of the shifts, optionally with bootstrap intervals.
+
+
+def stats_columns(st, columns):
+    """Stats of group_stats in the layout of the former per-group Series
+
+    The columns (a dict of output name -> stats name) follow the group
+    columns in sorted order and N is a float, as it was when every
+    group returned a pd.Series of its stats.
+    """
+    x = st[[c for c in st.columns if c not in ['N', 'mean', 'std', 'sem']]].copy()
+    for name in sorted(columns):
+        value = columns[name]
+        x[name] = st[value].astype(np.float64) if isinstance(value, str) else float(value)
+    return x
+
+
+def mk_subjects(df):
+    subs = df['subject'].unique()
+    return '_'.join(map(lambda x: x[:2],  subs)) if len(subs) > 1 else subs[0]
+
+
+def ana_arguments(parser):
+    parser.add_argument('-C', '--combine', dest='combine', action='store_true', default=False)
+    parser.add_argument('--col', type=str, default='shift')
+    parser.add_argument('-M', '--mean', dest='mean', action='store_true', default=False)
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='add confidence intervals of the mean from N resamples')
+    parser.add_argument('--ci', choices=sorted(CI_METHODS), default='bca',
+                        help='bootstrap interval method')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='1 - confidence level of the bootstrap intervals')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes used for bootstrapping (0: all cores)')
+
+
+def bootstrap_ci(df, groups, args):
+    pool = make_pool(args.jobs)
+    try:
+        return group_bootstrap(df, groups, args.col, args.bootstrap, alpha=args.alpha,
+                               method=args.ci, seed=args.seed, pool=pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def analyse(df, args):
+    groups = ['bg', 'size', 'fg', 'subject']
+
+    if args.combine:
+        groups.remove('subject')
+
+    if args.mean:
+        groups.remove('bg')
+
+    st = group_stats(df, groups, args.col)
+    x = stats_columns(st, {args.col: 'mean', 'err': 'sem', 'N': 'N'})
+
+    if args.bootstrap > 0:
+        x['ci_low'], x['ci_high'] = bootstrap_ci(df, groups, args)
+
+    if args.combine:
+        x['subject'] = mk_subjects(df)
+
+    return x
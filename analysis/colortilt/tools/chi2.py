@@ -0,0 +1,139 @@
+from __future__ import (absolute_import, division, print_function)
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from colortilt.core import GroupedData, factorize, make_pool
+from colortilt.stats import permutation_tests
+
+
+# ct-chi2: compare the sizes via chi-squared or permutation tests.
+
+
+def chi_squared_sizes(df, groups):
+    """Chi-squared test of the curves of all pairs of sizes for all groups
+
+    Shifts and errors are arranged in a dense (group, size, fg) array
+    and all size pairs of all groups are compared at once; the curves
+    are matched by fg. Only pairs of sizes that are both present in a
+    group are reported, the degrees of freedom are the number of
+    foreground hues measured for both sizes.
+    """
+    from scipy import stats
+
+    gd = GroupedData(df, groups)
+    sizes, s = factorize(df['size'])
+    fgs, f = factorize(df['fg'])
+    g = gd.row_group
+    valid = (g >= 0) & (s >= 0) & (f >= 0)
+    g, s, f = g[valid], s[valid], f[valid]
+
+    shape = (len(gd), len(sizes), len(fgs))
+    shift = np.full(shape, np.nan)
+    err = np.full(shape, np.nan)
+    present = np.zeros(shape, dtype=bool)
+    shift[g, s, f] = np.asarray(df['shift'], dtype=np.float64)[valid]
+    err[g, s, f] = np.asarray(df['err'], dtype=np.float64)[valid]
+    present[g, s, f] = True
+
+    pairs = list(itertools.combinations(range(len(sizes)), 2))
+    a = np.array([i for i, _ in pairs], dtype=np.int64)
+    b = np.array([j for _, j in pairs], dtype=np.int64)
+    both = present[:, a, :] & present[:, b, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (shift[:, a, :] - shift[:, b, :])**2 / (err[:, a, :]**2 + err[:, b, :]**2)
+    chi2 = np.where(both, r, 0.0).sum(axis=2)
+    dof = both.sum(axis=2)
+    p = stats.chi2.sf(chi2, dof)
+
+    # groups x pairs, only where both sizes were measured
+    gi, pi = np.nonzero(present.any(axis=2)[:, a] & present.any(axis=2)[:, b])
+    names = np.array(['%s_%s' % (sizes[i], sizes[j]) for i, j in zip(a, b)], dtype=object)
+    x = pd.DataFrame({k: gd.key_column(k)[gi] for k in groups}, columns=groups)
+    x['combination'] = names[pi]
+    x['chi2'] = np.round(chi2[gi, pi], 3)
+    x['dof'] = dof[gi, pi].astype(np.float64)
+    x['p'] = np.round(p[gi, pi], 4)
+
+    # rows of a group ordered by the name of the combination, as before
+    order = np.lexsort((x['combination'].values, gi))
+    return x.iloc[order].reset_index(drop=True)
+
+
+def permutation_arguments(parser, help='permutation test on trial data with up to N permutations'):
+    parser.add_argument('--permutations', type=int, default=0, metavar='N', help=help)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes used for the permutations (0: all cores)')
+
+
+def check_trial_data(df, message='Permutation tests need trial data (ct-load), not means'):
+    if 'err' in df.columns or 'shift' not in df.columns:
+        raise ValueError(message)
+
+
+def run_permutation_tests(tests, args):
+    pool = make_pool(args.jobs)
+    try:
+        return permutation_tests(tests, args.permutations, alpha=args.alpha,
+                                 seed=args.seed, pool=pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def permutation_test_sizes(df, groups, args):
+    """Permutation tests of all pairs of sizes for all groups of trials
+
+    The size labels of the trials of a pair are shuffled within every
+    foreground hue; the result has the columns of chi_squared_sizes
+    (chi2 is the statistic of the trials, dof the number of hues used)
+    plus the number of permutations that were needed.
+    """
+    check_trial_data(df)
+    gd = GroupedData(df, groups)
+    sizes, s = factorize(df['size'])
+    shift = np.asarray(df['shift'], dtype=np.float64)
+    fg = np.asarray(df['fg'], dtype=np.float64)
+
+    rows, tests = [], []
+    for i in range(len(gd)):
+        idx = gd.order[gd.offsets[i]:gd.offsets[i+1]]
+        present = np.unique(s[idx])
+        for a, b in itertools.combinations(present[present >= 0], 2):
+            sel = idx[(s[idx] == a) | (s[idx] == b)]
+            tests.append((shift[sel], s[sel] == a, fg[sel]))
+            rows.append((i, '%s_%s' % (sizes[a], sizes[b])))
+
+    gi = np.array([r[0] for r in rows], dtype=np.int64)
+    stat, p, n, dof = run_permutation_tests(tests, args)
+    x = pd.DataFrame({k: gd.key_column(k)[gi] for k in groups}, columns=groups)
+    x['combination'] = [r[1] for r in rows]
+    x['chi2'] = np.round(stat, 3)
+    x['dof'] = dof.astype(np.float64)
+    x['p'] = np.round(p, 4)
+    x['permutations'] = n
+
+    order = np.lexsort((x['combination'].values, gi))
+    return x.iloc[order].reset_index(drop=True)
+
+
+def test_significance(chi2, alpha):
+    chi2['sig'] = chi2['p'] < alpha
+    return chi2
+
+
+def chi2_arguments(parser):
+    parser.add_argument('--alpha', type=float, default=0.01)
+    permutation_arguments(parser)
+
+
+def chi2_sizes(df, args):
+    if args.permutations > 0:
+        dfg = permutation_test_sizes(df, ['bg', 'subject'], args)
+    else:
+        dfg = chi_squared_sizes(df, ['bg', 'subject'])
+    return test_significance(dfg, args.alpha)
@@ -0,0 +1,107 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.core import GroupedData
+from colortilt.io import read_data
+from colortilt.tools.chi2 import permutation_arguments, check_trial_data, run_permutation_tests
+
+
+# ct-cmpold: compare the curves with the old data set.
+
+
+def chi_squared_two_curves(row):
+    from scipy import stats
+
+    d2 = (row['shift'] - row['oshift'])**2
+    e2 = row['err']**2 + row['oerr']**2
+    r = d2 / e2
+    chi2 = sum(r)
+    dof = len(row)
+    p = 1.0 - stats.chi2.cdf(chi2, dof)
+    return pd.Series({'chi2': np.round(chi2, 3),
+                      'p': np.round(p, 3),
+                      'dof': dof})
+
+
+def test_significance_two_curves(df, alpha=0.01):
+    gd = df.groupby(['size', 'bg'])
+    chi2 = gd.apply(chi_squared_two_curves)
+    chi2.reset_index(inplace=True)
+    del chi2['size']
+    chi2['sig'] = chi2['p'] < alpha
+    return chi2
+
+
+def permutation_test_two_curves(df, old_df, args):
+    """Permutation test of new vs. old trials for every surround
+
+    The labels (old or new) are shuffled within every foreground hue,
+    the columns are the ones of test_significance_two_curves.
+    """
+    check_trial_data(df, 'cmpold --permutations needs the trials of the subject (ct-load), not means (ct-ana)')
+    check_trial_data(old_df, 'cmpold --permutations needs the trials of the old data set, but %s has means '
+                             '(bg, fg, shift, err); write its trials with ct-load --data, e.g. '
+                             'ct-load.py --data OLD/*.dat > old-trials.csv' % args.olddata)
+    new = df[['bg', 'fg', 'shift']].assign(new=True)
+    old = old_df[['bg', 'fg', 'shift']].assign(new=False)
+    both = pd.concat([new, old], ignore_index=True)
+
+    gd = GroupedData(both, ['bg'])
+    shift = np.asarray(both['shift'], dtype=np.float64)
+    fg = np.asarray(both['fg'], dtype=np.float64)
+    is_new = np.asarray(both['new'])
+    tests = []
+    for i in range(len(gd)):
+        idx = gd.order[gd.offsets[i]:gd.offsets[i+1]]
+        tests.append((shift[idx], is_new[idx], fg[idx]))
+
+    stat, p, n, dof = run_permutation_tests(tests, args)
+    x = pd.DataFrame({'bg': gd.key_column('bg')})
+    x['chi2'] = np.round(stat, 3)
+    x['dof'] = dof.astype(np.float64)
+    x['p'] = np.round(p, 3)
+    x['permutations'] = n
+    x['sig'] = x['p'] < args.alpha
+    return x
+
+
+def cmpold_arguments(parser):
+    parser.add_argument('subject', type=str)
+    parser.add_argument('olddata', type=str)
+    parser.add_argument('--inner', action='store_true', default=False)
+    parser.add_argument('--chi2', action='store_true', default=False)
+    parser.add_argument('--alpha', type=float, default=0.01)
+    permutation_arguments(parser, help='permutation test with up to N permutations; needs trials, '
+                                       'not means, for both data (ct-load) and olddata '
+                                       '(ct-load.py --data OLD/*.dat)')
+
+
+def compare_old(df, args):
+    if args.subject not in df.subject.unique():
+        raise ValueError('Subject not in new data!')
+
+    df = df[df.subject == args.subject]
+    df = df[df['size'] == 40]
+
+    old_df = read_data([args.olddata])
+    if args.permutations > 0:
+        return permutation_test_two_curves(df, old_df, args)
+    old_df['size'] = 40
+
+    old_df.columns = ['bg', 'fg', 'oshift', 'oerr', 'size']
+    dfi = df.set_index(['size', 'bg', 'fg'])
+    dfo = old_df.set_index(['size', 'bg', 'fg'])
+
+    kwargs = {}
+    if args.chi2 or args.inner:
+        kwargs['join'] = 'inner'
+
+    dfa = pd.concat([dfi, dfo], axis=1, **kwargs)
+    x = dfa.reset_index()
+    x.subject = args.subject
+
+    if args.chi2:
+        return test_significance_two_curves(x, alpha=args.alpha)
+    return x
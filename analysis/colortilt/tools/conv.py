@@ -0,0 +1,56 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.core import GroupedData
+
+
+# ct-conv: relative and absolute foreground hues and shifts.
+
+
+def rename_fg(df, which, fg_out):
+    out = df.loc[which].copy()
+    out.fg = fg_out[which]
+    return out
+
+
+def rel2abs(df, args):
+    df.fg = (df.fg + np.where(df.bg == -1, 0, df.bg)) % 360.0
+
+    if args.extend:
+        # wrap around the first and last hue of every curve
+        keys = [k for k in ['subject', 'size', 'bg'] if k in df.columns]
+        gd = GroupedData(df, keys)
+        valid = gd.row_group >= 0
+        start = gd.reduce(np.minimum, 'fg')[gd.row_group]
+        stop = gd.reduce(np.maximum, 'fg')[gd.row_group]
+        delta = (start - stop) % 360.0
+        left, right = start - delta, stop + delta
+
+        fg = np.asarray(df.fg)
+        upper = rename_fg(df, valid & (fg == start), right)
+        lower = rename_fg(df, valid & (fg == stop), left)
+
+        df = pd.concat([df, upper, lower], ignore_index=True)
+    return df
+
+
+def abs_shift(df, args):
+    df['shift'] = np.abs(df['shift'])
+    return df
+
+
+def conv_arguments(parser):
+    subparsers = parser.add_subparsers(help='sub-command help')
+
+    sp_r2a = subparsers.add_parser('rel2abs', help='a help')
+    sp_r2a.add_argument('--no-extend', action='store_false', default=True, dest='extend')
+    sp_r2a.set_defaults(dispatch=rel2abs)
+
+    as_r2a = subparsers.add_parser('abs-shift', help='a help')
+    as_r2a.set_defaults(dispatch=abs_shift)
+
+
+def convert(df, args):
+    return args.dispatch(df, args)
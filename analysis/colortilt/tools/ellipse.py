@@ -0,0 +1,77 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.core import factorize, make_pool
+from colortilt.tables import group_points
+
+
+# ct-ellipse: ellipses fitted to the spread over the surround hues.
+
+
+def ellipse_arguments(parser):
+    parser.add_argument('--column', default=None, type=str,
+                        help='radius column (default: spread or slope_mean_abs)')
+    parser.add_argument('--by', nargs='*', default=None, type=str,
+                        help='fit one ellipse per group (default: subject and size, if present)')
+    parser.add_argument('--max-iter', dest='max_iter', default=100, type=int)
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='add confidence intervals of ratio, eccentricity and orientation from N refits')
+    parser.add_argument('--resample', default=None, type=str, metavar='COL',
+                        help='resample the values of COL, e.g. subject (default: the points)')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='1 - confidence level of the bootstrap intervals')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes used for bootstrapping (0: all cores)')
+
+
+def fit_ellipse_groups(df, args):
+    """Fit an ellipse over the surround hues (bg) to the radius column for every group"""
+    from colortilt.ellipse import fit_ellipses, ellipse_shape
+
+    col = args.column or ('spread' if 'spread' in df.columns else 'slope_mean_abs')
+    groups = args.by if args.by is not None else [c for c in ['subject', 'size'] if c in df.columns]
+    df = df[df.bg != -1]
+    units = factorize(df[args.resample])[1] if args.resample else np.arange(len(df))
+    df = df.assign(_unit=np.where(units >= 0, units, np.nan))
+
+    gd, (theta, rho, unit) = group_points(df, groups, ['bg', col, '_unit'])
+    # negative radii are the mirrored point and the ellipse is symmetric
+    theta, rho = theta / 180.0 * np.pi, np.abs(rho)
+    params, cov, converged = fit_ellipses(theta, rho, max_iter=args.max_iter)
+    ratio, eccentricity, orientation, orientation_err = ellipse_shape(params, cov)
+
+    x = pd.DataFrame({k: gd.key_column(k) for k in groups}, columns=groups)
+    x['n'] = np.sum(np.isfinite(rho), axis=1)
+    x['a'] = params[:, 0]
+    x['b'] = params[:, 1]
+    x['phi'] = params[:, 2] / np.pi * 180.0
+    x['ratio'] = ratio
+    x['eccentricity'] = eccentricity
+    x['orientation'] = orientation / np.pi * 180.0
+    x['orientation_err'] = orientation_err / np.pi * 180.0
+    x['converged'] = converged
+
+    if args.bootstrap > 0:
+        lo, hi, used = ellipse_ci(list(zip(theta, rho, unit)), orientation, args)
+        for k, name in enumerate(['ratio', 'eccentricity']):
+            x[name + '_low'], x[name + '_high'] = lo[:, k], hi[:, k]
+        x['orientation_low'] = lo[:, 2] / np.pi * 180.0
+        x['orientation_high'] = hi[:, 2] / np.pi * 180.0
+        x['resamples'] = used
+    return x
+
+
+def ellipse_ci(points, orientation, args):
+    from colortilt.ellipse import ellipse_bootstrap
+
+    pool = make_pool(args.jobs)
+    try:
+        return ellipse_bootstrap(points, args.bootstrap, orientation, alpha=args.alpha,
+                                 seed=args.seed, pool=pool, max_iter=args.max_iter)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,52 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.angles import angle_shift
+from colortilt.tables import group_points
+
+
+# ct-fit: induction models fitted to the curves.
+
+
+def fit_arguments(parser):
+    from colortilt.models import MODELS
+
+    parser.add_argument('--model', choices=sorted(MODELS), default='dog',
+                        help='first derivative of a Gaussian or sum of sinusoids')
+    parser.add_argument('--harmonics', default=2, type=int, help='number of sinusoids (sin)')
+    parser.add_argument('--col', type=str, default='shift')
+    parser.add_argument('--by', nargs='*', default=None, type=str,
+                        help='fit one curve per group (default: subject, size and bg, if present)')
+    parser.add_argument('--weighted', default=False, action='store_true',
+                        help='weight the points with 1/err**2')
+    parser.add_argument('--max-iter', dest='max_iter', default=100, type=int)
+
+
+def fit_models(df, args):
+    """Fit an induction model to the shift over fg of every curve"""
+    from colortilt.models import make_model, fit_curves
+
+    model = make_model(args.model, args.harmonics)
+    groups = args.by if args.by is not None else [c for c in ['subject', 'size', 'bg'] if c in df.columns]
+    df = df[df.bg != -1]
+    if any(np.unique(df.fg) > 180.0):
+        df = df.assign(fg=angle_shift(df.fg, df.bg))
+
+    cols = ['fg', args.col] + (['err'] if args.weighted else [])
+    gd, tables = group_points(df, groups, cols)
+    x, y = tables[0], tables[1]
+    with np.errstate(divide='ignore'):
+        w = 1.0 / tables[2]**2 if args.weighted else None
+    params, err, converged, gof = fit_curves(model, x, y, weights=w, max_iter=args.max_iter)
+
+    res = pd.DataFrame({k: gd.key_column(k) for k in groups}, columns=groups)
+    res['n'] = np.sum(np.isfinite(x) & np.isfinite(y), axis=1)
+    for k, name in enumerate(model.params):
+        res[name] = params[:, k]
+        res[name + '_err'] = err[:, k]
+    for name in ['rss', 'r2', 'rmse', 'aic']:
+        res[name] = gof[name]
+    res['converged'] = converged
+    return res
@@ -0,0 +1,57 @@
+from __future__ import (absolute_import, division, print_function)
+
+import sys
+
+from colortilt.core import Experiment, make_pool
+from colortilt.io import read_data
+from colortilt.angles import angle_shift
+from colortilt.schema import apply_schema
+
+
+# ct-load: the trials of an experiment (or of data files) with their shifts.
+
+
+def load_arguments(parser):
+    parser.add_argument('--data', nargs='+', type=str)
+    parser.add_argument('--exclude-files', dest='fnfilter', type=str)
+    parser.add_argument('--no-cache', dest='cache', action='store_false', default=True)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes used for parsing (0: all cores)')
+    parser.add_argument('experiment', nargs='?', type=str, default=None)
+    parser.add_argument('subjects', nargs='*', type=str, default=None)
+
+
+def add_shifts(df):
+    df.rename(columns={'fg': 'fg_abs'}, inplace=True)
+    df['shift'] = angle_shift(df['phi'], df['fg_abs'])
+    df['fg'] = angle_shift(df['fg_abs'], df['bg'])
+    return apply_schema(df)
+
+
+def load_subjects(exp, subjects, filterfn, args):
+    pool = make_pool(args.jobs)
+    try:
+        df = exp.load_subjects_data(subjects, filterfn, use_cache=args.cache, pool=pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return df
+
+
+def select_subjects(exp, args):
+    subjects = list(filter(lambda s: len(s), args.subjects)) or list(exp.subjects)
+    print('[i] subjects: ' + ' '.join(subjects), file=sys.stderr)
+    return subjects
+
+
+def load(df, args):
+    if args.experiment:
+        exp = Experiment.load_from_path(args.experiment)
+        subjects = select_subjects(exp, args)
+        df = load_subjects(exp, subjects, args.fnfilter, args)
+    else:
+        df = read_data(args.data)
+        df['subject'] = 'data'
+
+    return add_shifts(df)
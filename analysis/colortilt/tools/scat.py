@@ -0,0 +1,29 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+
+# ct-scat: the shift at size 40 and the range of the shifts over the sizes.
+
+
+def calc_delta(a):
+    x_10 = np.mean(a.loc[a['size'] == 10.0]['shift'].values)
+    x_40 = np.mean(a.loc[a['size'] == 40.0]['shift'].values)
+    x_160 = np.mean(a.loc[a['size'] == 160.0]['shift'].values)
+    upper = np.max(a['shift'])
+    lower = np.min(a['shift'])
+    #sign = -1 if fg < 0 else 1
+    sign = 1
+    #delta = sign * (x_10 - x_160)
+    delta = upper - lower
+    return pd.Series({'40': sign * x_40,
+                      'delta': delta,
+                      'sign': sign})
+
+
+def scat(df, args):
+    df = df[df.bg != -1]
+    dfg = df.groupby(['bg', 'fg'])[['size', 'shift']]
+    x = dfg.apply(calc_delta)
+    return x.reset_index()
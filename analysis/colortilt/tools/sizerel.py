@@ -0,0 +1,71 @@
+from __future__ import (absolute_import, division, print_function)
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# ct-sizerel: the size of the induction near the surround hue for every size.
+
+
+def sizerel_groups(df):
+    return [c for c in ['bg', 'size'] if c in df.columns]
+
+
+def mean_angle(df, sign, use_mean=False):
+    x = df[(df.fg == sign*22.5) | (df.fg == sign*67.5)]
+    grouped = x.groupby(sizerel_groups(x))
+
+    if use_mean:
+        fn = np.mean
+    else:
+        fn = np.max if sign > 0 else np.min
+
+    return grouped['shift'].agg(fn).rename('m_plus' if sign > 0 else 'm_minus')
+
+
+def calc_sizerel_avg(df, cargs):
+    m_plus = mean_angle(df, 1, use_mean=cargs.mean)
+    m_minus = mean_angle(df, -1, use_mean=cargs.mean)
+
+    x = pd.concat([m_plus, m_minus], axis=1)
+    x = x.reset_index()
+
+    abs_mean = lambda x, y: np.mean([np.abs(x), np.abs(y)])
+    x['m_mean'] = x['m_plus'].combine(x['m_minus'], abs_mean)
+    return x
+
+
+def make_m_mean(x):
+    idx = x['shift'].abs().idxmax()
+    data = [x.loc[idx]]
+    fg = data[0].fg
+    xk = x[x.fg == fg]
+    m_mean = xk['shift'].abs().mean()
+    m_merr = xk['shift'].abs().sem()
+    return pd.Series({'m_mean': m_mean, 'm_merr': m_merr})
+
+
+def calc_sizerel(df, cargs):
+    grouped = df.groupby(sizerel_groups(df))
+    x = grouped.apply(make_m_mean)
+    return x.reset_index()
+
+
+def sizerel_arguments(parser):
+    parser.add_argument('--mean', action='store_true', default=False)
+
+
+def sizerel(df, args):
+    if 'bg' in df.columns:
+        df = df[df.bg != -1]
+
+    subjects = df['subject'].unique()
+    have_avg = len(subjects) == 1 and '_' in subjects[0]
+
+    if have_avg:
+        print('[I] sizerel: using average method!', file=sys.stderr)
+        return calc_sizerel_avg(df, args)
+    else:
+        return calc_sizerel(df, args)
@@ -0,0 +1,100 @@
+from __future__ import (absolute_import, division, print_function)
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from colortilt.stats import group_stats, weighted_linear_fit
+from colortilt.tables import size_table
+from colortilt.tools.ana import stats_columns
+
+
+# ct-slope: slope of the induction over the (log) size.
+
+
+def calc_mean_over_surrounds(df):
+    st = group_stats(df, ['size', 'subject'], 'm_mean')
+    return stats_columns(st, {'bg': -2, 'm_mean': 'mean', 'm_merr': 'sem', 'N': 'N'})
+
+
+def pair_slopes(sizes, y, pairs):
+    """Slopes of y over log size between the sizes of every pair"""
+    x = np.log(np.asarray(sizes, dtype=np.float64))
+    return {'slope_%s_%s' % (sizes[i], sizes[j]): (y[:, j] - y[:, i]) / (x[j] - x[i])
+            for i, j in pairs}
+
+
+def slope_avg_surrounds(df, args):
+
+    if args.nos:
+        df = df[df.bg != 270]
+        df = df[df.bg != 90]
+
+    md = calc_mean_over_surrounds(df)
+
+    gd, sizes, y = size_table(md, ['subject'], 'm_mean')
+    pairs = [(i, i + 1) for i in range(len(sizes) - 1)]
+    slopes = pair_slopes(sizes, y, pairs)
+    subjects = gd.key_column('subject')
+    for i, subject in enumerate(subjects):
+        prefix = 'Slope, ' if len(subjects) == 1 else 'Slope, %s, ' % subject
+        for a, b in pairs:
+            value = slopes['slope_%s_%s' % (sizes[a], sizes[b])][i]
+            print(prefix + '%s, %s' % (sizes[b], sizes[a]), value, file=sys.stderr)
+    return md
+
+
+def slope_avg_sizes(df, args):
+    groups = ['bg', 'subject']
+    gd, sizes, y = size_table(df, groups, 'm_mean', args.sizes)
+    if len(sizes) < 2:
+        raise ValueError('Need at least two sizes for a slope')
+
+    x = pd.DataFrame({k: gd.key_column(k) for k in groups}, columns=groups)
+    res = {}
+    last = len(sizes) - 2
+
+    if args.method == 'mean':
+        res.update(pair_slopes(sizes, y, [(i, i + 1) for i in range(len(sizes) - 1)]))
+        res.update(pair_slopes(sizes, y, [(0, len(sizes) - 1)]))
+        res['slope_mean'] = np.mean([res['slope_%s_%s' % (sizes[i], sizes[i + 1])]
+                                     for i in range(len(sizes) - 1)], axis=0)
+        res['slope_mean_abs'] = -1 * res['slope_%s_%s' % (sizes[last], sizes[last + 1])]
+    else:
+        if args.method == 'last':
+            y = y[:, last:]
+            sizes = sizes[last:]
+            res.update(pair_slopes(sizes, y, [(0, 1)]))
+        if 'm_merr' in df.columns and args.weights:
+            _, _, err = size_table(df, groups, 'm_merr', sizes)
+            # weigh by the inverse variance only if all errors of a group are usable
+            usable = np.all(np.isnan(y) | (np.isfinite(err) & (err > 0)), axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                w = np.where(usable[:, np.newaxis], 1.0 / err**2, 1.0)
+        else:
+            w = np.ones_like(y)
+        slope, intercept, se, p, _ = weighted_linear_fit(np.log(sizes.astype(np.float64)), y, w)
+        res.update({'slope': slope, 'intercept': intercept, 'err': se, 'p': p,
+                    'slope_mean_abs': -1 * slope})
+
+    for name in sorted(res):
+        x[name] = res[name]
+    return x
+
+
+def slope_arguments(parser):
+    parser.add_argument('over', choices=['surrounds', 'size'])
+    parser.add_argument('--method', choices=['mean', 'regress', 'last'], default='regress')
+    parser.add_argument('--no-s', dest='nos', action='store_true', default=False)
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help='sizes to use for the slopes (default: all)')
+    parser.add_argument('--no-weights', dest='weights', action='store_false', default=True,
+                        help='do not weigh by m_merr in the regression')
+
+
+def slope(df, args):
+    if args.over == 'surrounds':
+        return slope_avg_surrounds(df, args)
+    else:
+        return slope_avg_sizes(df, args)
@@ -0,0 +1,95 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.tables import position_table, size_table, size_column
+
+
+# ct-spread: spread of the shifts over the sizes.
+
+
+def calc_spread(df, groups, ref=40):
+    """Spread of the shifts over the sizes for every group
+
+    Upper and lower shift, the sizes where they occur (the smallest
+    one for ties), their difference and, if ref is not None, the shift
+    at the size ref. Columns in sorted order after the group columns.
+    """
+    gd, sizes, y = size_table(df, groups, 'shift')
+    missing = np.isnan(y)
+    empty = missing.all(axis=1)
+    rows = np.arange(len(y))
+    iu = np.argmax(np.where(missing, -np.inf, y), axis=1)
+    il = np.argmin(np.where(missing, np.inf, y), axis=1)
+
+    upper, lower = y[rows, iu], y[rows, il]
+    res = {'spread': upper - lower,
+           'size_upper': np.where(empty, np.nan, sizes[iu]),
+           'size_lower': np.where(empty, np.nan, sizes[il]),
+           'upper': upper,
+           'lower': lower}
+    if ref is not None:
+        res['ref'] = size_column(sizes, y, ref)
+
+    x = pd.DataFrame({k: gd.key_column(k) for k in groups}, columns=groups)
+    for name in sorted(res):
+        x[name] = res[name]
+    return x
+
+
+def max_spread(x, col='spread'):
+    """The row of x with the largest col (first fg for ties) for every bg and subject
+
+    Groups without any (non-NaN) value of col are left out.
+    """
+    gd, fgs, pos = position_table(x, ['bg', 'subject'], 'fg')
+    data = np.append(np.asarray(x[col], dtype=np.float64), np.nan)[pos]
+    valid = np.flatnonzero(~np.all(np.isnan(data), axis=1))
+    best = np.argmax(np.where(np.isnan(data[valid]), -np.inf, data[valid]), axis=1)
+    return x.iloc[pos[valid, best]]
+
+
+def convert2sizerel(x, df):
+    idx = ['bg', 'fg', 'subject']
+    smax = max_spread(x)[idx]
+    sizerel = smax.merge(df, on=idx, how='left', sort=False)
+    sizerel.rename(columns={'shift': 'm_mean', 'err': 'm_merr'}, inplace=True)
+    return sizerel
+
+
+def spread_slrel(x, df, ref):
+    idx = ['bg', 'fg', 'subject']
+    data = convert2sizerel(x, df)
+    gd, sizes, y = size_table(data, idx, 'm_mean')
+
+    if ref == '40':
+        scat = size_column(sizes, y, 40)
+    elif ref == 'mean28':
+        scat = (size_column(sizes, y, 40) + size_column(sizes, y, 160)) / 2.0
+    else:
+        scat = np.max(np.where(np.isnan(y), -np.inf, y), axis=1)
+
+    data['ref'] = scat[gd.row_group]
+    data['m_mean'] = data['m_mean'] / data['ref']
+    del data['m_merr']
+    return data
+
+
+def spread_arguments(parser):
+    parser.add_argument('--sizerel', default=False, action='store_true')
+    parser.add_argument('--max-spread', dest='maxspread', default=False, action='store_true')
+    parser.add_argument('--sl-rel', dest='slrel', choices={'40', 'upper', 'mean28'}, default=None)
+
+
+def spread(df, args):
+    x = calc_spread(df, ['bg', 'fg', 'subject'])
+
+    if args.sizerel:
+        x = convert2sizerel(x, df)
+    elif args.maxspread:
+        x = max_spread(x)
+    elif args.slrel:
+        x = spread_slrel(x, df, args.slrel)
+
+    return x
@@ -0,0 +1,29 @@
+from __future__ import (absolute_import, division, print_function)
+
+from colortilt.io import read_data, write_data, FORMATS
+
+
+# Reading and writing the frames passed between the tools, as csv or
+# in the binary format of colortilt.io.
+
+
+def read_arguments(parser):
+    parser.add_argument('data', nargs='*', type=str, default=['-'])
+
+
+def read(df, args):
+    return read_data(args.data)
+
+
+def format_arguments(parser):
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help='output format, bin is faster for pipes to other ct tools')
+
+
+def write_arguments(parser):
+    parser.add_argument('output', nargs='?', type=str, default='-')
+    format_arguments(parser)
+
+
+def write(df, args):
+    write_data(df, args.output, args.format)
@@ -0,0 +1,55 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+from colortilt.core import GroupedData
+from colortilt.stats import group_stats, segment_sum
+from colortilt.tools.ana import stats_columns, mk_subjects
+
+
+# ct-szdiff: variation of the shifts over the sizes.
+
+
+def size_diff_error(df, groups, st, dbm=False):
+    """Error of the std (ddof=0) of the shifts of every group, propagated from err
+
+    With dbm the error of std / mean; NaN if df has no err column.
+    """
+    if 'err' not in df.columns:
+        return np.full(len(st), np.nan)
+    gd = GroupedData(df, groups)
+    x = gd.column('shift').astype(np.float64)
+    e = gd.column('err').astype(np.float64)
+    n, m, s = [np.repeat(np.asarray(st[c], dtype=np.float64), gd.sizes) for c in ['N', 'mean', 'std']]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # d std / d x_i, and of std / mean with dbm
+        d = (x - m) / (n * s)
+        if dbm:
+            d = d / m - s / (n * m * m)
+        var = segment_sum(np.where(np.isfinite(x), d * d * e * e, 0.0), gd.offsets)
+    return np.sqrt(var)
+
+
+def szdiff_arguments(parser):
+    parser.add_argument('--combine', action='store_true', default=False)
+    parser.add_argument('--dbm', action='store_true', default=False)
+
+
+def size_diff(df, args):
+    """Standard deviation of the shifts over the sizes for every hue"""
+    groups = ['bg', 'fg', 'subject']
+
+    if args.combine:
+        groups.remove('subject')
+
+    st = group_stats(df, groups, 'shift', ddof=0)
+    err = size_diff_error(df, groups, st, dbm=args.dbm)
+    if args.dbm:
+        st['std'] /= st['mean']
+    x = stats_columns(st, {'szdiff': 'std', 'N': 'N'})
+    x.insert(x.columns.get_loc('szdiff'), 'err', err)
+
+    if args.combine:
+        x['subject'] = mk_subjects(df)
+
+    return x
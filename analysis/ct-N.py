@@ -5,40 +5,23 @@ from __future__ import division
 
 import pandas as pd
 import argparse
+import json
 import sys
-from collections import defaultdict
-from functools import partial
 import numpy as np
 
+from colortilt.core import GroupedData
+from colortilt.io import read_data, binary_stream
+
 #global flags
 do_debug = False
 
 
-def NestedDefaultDict(levels, baseFn):
-    def NDD(lvl):
-        return partial(defaultdict, NDD(lvl-1)) if lvl > 0 else baseFn
-    return defaultdict(NDD(levels-1))
-
-
-def read_data(file_list):
-    if len(file_list) == 1 and file_list[0] == '-':
-        file_list[0] = sys.stdin
-
-    df = pd.read_csv(file_list[0], skipinitialspace=True)
-    if len(file_list) > 1:
-        for data in file_list[1:]:
-            to_append = pd.read_csv(data, skipinitialspace=True)
-            df = df.append(to_append, ignore_index=True)
-    return df
+ON = [0, 90, 180, 270]
 
 
 def on_or_off(value):
-    on = [0, 90, 180, 270]
-    value = abs(value)
-    if value in on:
-        return 1
-    else:
-        return 0
+    """1 for the on axes (0, 90, 180, 270), 0 otherwise"""
+    return np.isin(np.abs(value), ON).astype(np.int64)
 
 
 def debug(*args, **kwargs):
@@ -46,73 +29,84 @@ def debug(*args, **kwargs):
         print(*args, **kwargs)
 
 
-def make_stats(df):
-    dfg = df.groupby(['subject', 'size', 'bg', 'fg'])
-    stats = NestedDefaultDict(4, list)
-    debug(dfg.groups, file)
-    for k, v in dfg.groups.iteritems():
-        bg = on_or_off(k[2])
-        fg = on_or_off(k[3])
-        sz = k[1]
-        sb = k[0]
-
-        if bg == -1 or fg == -1:
-            print('Warning: %s no off or on' % str(k))
-            continue
-        data = int(dfg.get_group(k)['N'].iloc[0])
-        stats[bg][fg][sz][sb].append(data)
+def make_cells(df):
+    """Number of trials of every (subject, size, bg, fg) cell
+
+    Besides N, every cell gets its on/off class of bg and fg, the
+    median N of all cells of the subject and size with that class and
+    whether trials are missing, i.e. N is below the median.
+    """
+    groups = ['subject', 'size', 'bg', 'fg']
+    gd = GroupedData(df, groups)
+    cells = pd.DataFrame({k: gd.key_column(k) for k in groups}, columns=groups)
+    cells['N'] = np.asarray(df['N'])[gd.order[gd.offsets[:-1]]].astype(np.int64)
+    cells['bg_on'] = on_or_off(cells['bg'])
+    cells['fg_on'] = on_or_off(cells['fg'])
+    classes = cells.groupby(['subject', 'size', 'bg_on', 'fg_on'])['N']
+    cells['median'] = classes.transform('median')
+    cells['missing'] = cells['N'] < cells['median']
+    debug(cells)
+    return cells
+
+
+def make_stats(cells):
+    """Mean and median N for every subject, size and on/off class"""
+    gpd = cells.groupby(['subject', 'size', 'bg_on', 'fg_on'])
+    stats = gpd['N'].agg(['mean', 'median']).reset_index()
     debug(stats)
     return stats
 
 
+def make_subjects(cells):
+    """Number of cells, cells with missing trials and trials per subject"""
+    gpd = cells.groupby('subject')
+    return pd.DataFrame({'cells': gpd['N'].count(),
+                         'missing': gpd['missing'].sum().astype(np.int64),
+                         'trials': gpd['N'].sum()},
+                        columns=['cells', 'missing', 'trials']).reset_index()
+
+
 def show_summary(stats, df):
 
     sizes = df['size'].unique()
     om = ['off', 'on ']
     sm = {10: '0.5', 40: '2  ', 160: '8  '}
+    keys = zip(stats['subject'], stats['size'], stats['bg_on'], stats['fg_on'])
+    lookup = dict(zip(keys, zip(stats['mean'], stats['median'])))
     for sb in df['subject'].unique():
         print(sb)
         for sz in sizes:
             print('  ' + sm[sz])
             for bg in [0, 1]:
                 for fg in [0, 1]:
-                    data = stats[bg][fg][sz][sb]
-                    if len(data) == 0:
+                    if (sb, sz, bg, fg) not in lookup:
                         continue
-                    d_medi = np.median(data)
-                    d_mean = np.mean(data)
+                    d_mean, d_medi = lookup[(sb, sz, bg, fg)]
                     indicator = ' ! ' if d_mean != d_medi else ''
                     print('    %s %s %3.2f [%2.1f] %s' % (om[bg], om[fg], d_mean, d_medi, indicator))
 
 
-def show_detail(df, stats=None, missing_only=True):
-    dfg = df.groupby(['subject', 'size', 'bg', 'fg'])
-
-    for k, v in sorted(dfg.groups.iteritems()):
-        sb = k[0]
-        sz = k[1]
-        bg = k[2]
-        fg = k[3]
+def show_detail(cells, missing_only=True):
+    om = [u'⦿', u'●']
+    if missing_only:
+        cells = cells[cells['missing']]
 
-        bg_b = on_or_off(bg)
-        fg_b = on_or_off(fg)
+    out = binary_stream(sys.stdout)
+    for c in cells.itertuples(index=False):
+        indicator = ' ! ' if c.missing else ''
+        s = u"%10s  %3d %8.2f %s %8.2f %d [%2.1f] %s\n" % (c.subject, c.size, c.bg, om[c.bg_on],
+                                                           c.fg, c.N, c.median, indicator)
+        out.write(s.encode('utf-8'))
+    out.flush()
 
-        N = int(dfg.get_group(k)['N'].iloc[0])
-        indicator = ''
-        m = 0.0
-        om = [u'⦿', u'●']
 
-        if stats is not None:
-            data = stats[bg_b][fg_b][sz][sb]
-            m = np.median(data)
-            missing = N < m
-            if missing:
-                indicator = ' ! '
-            elif missing_only:
-                continue
-
-        s = u"%10s  %3d %8.2f %s %8.2f %d [%2.1f] %s\n" % (sb, sz, bg, om[bg_b], fg, N, m, indicator)
-        sys.stdout.write(s.encode('utf-8'))
+def write_json(cells, stats, missing_only=True):
+    records = lambda x: json.loads(x.to_json(orient='records'))
+    report = {'subjects': records(make_subjects(cells)),
+              'classes': records(stats),
+              'cells': records(cells[cells['missing']] if missing_only else cells)}
+    json.dump(report, sys.stdout, indent=1)
+    print()
 
 
 def main():
@@ -122,6 +116,8 @@ def main():
     parser.add_argument('--debug', action="store_true", default=False)
     parser.add_argument('--full', action="store_true", default=False)
     parser.add_argument('--subjects', action="store_true", default=False)
+    parser.add_argument('--format', choices=['text', 'csv', 'json'], default='text',
+                        help='text report, csv of the cells or json with cells and summaries')
     args = parser.parse_args()
 
     do_debug = args.debug
@@ -133,10 +129,16 @@ def main():
         subjects = np.unique(df.subject)
         print('\n'.join(subjects))
     else:
-        stats = make_stats(df)
-        show_detail(df, stats=stats, missing_only=not args.full)
-        show_summary(stats, df)
-
+        cells = make_cells(df)
+        stats = make_stats(cells)
+        if args.format == 'csv':
+            out = cells if args.full else cells[cells['missing']]
+            out.to_csv(sys.stdout, index=False)
+        elif args.format == 'json':
+            write_json(cells, stats, missing_only=not args.full)
+        else:
+            show_detail(cells, missing_only=not args.full)
+            show_summary(stats, df)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import sys
+import os
+
+import colortilt as ct
+from colortilt.core import READ_OPTIONS
+
+
+def cache_clear(exp, subjects, args):
+    for subject in subjects:
+        cache = exp.result_cache(subject)
+        print('[I] clearing cache for %s [%s]' % (subject, cache.path), file=sys.stderr)
+        cache.clear()
+
+
+def cache_rebuild(exp, subjects, args):
+    cache_clear(exp, subjects, args)
+    for subject in subjects:
+        df = exp.load_result_data(subject, use_cache=True)
+        print('[I] cached %s: %d trials' % (subject, len(df)), file=sys.stderr)
+
+
+def cache_info(exp, subjects, args):
+    for subject in subjects:
+        cache = exp.result_cache(subject)
+        files = exp.result_file_list(subject)
+        stale = cache.stale(files, READ_OPTIONS)
+        size = os.path.getsize(cache.path) if os.path.exists(cache.path) else 0
+        print('%10s %5d cached %5d stale %10d bytes  %s' % (subject, len(cache.entries), len(stale), size, cache.path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CT - result file cache')
+    subparsers = parser.add_subparsers(help='sub-command help')
+
+    sp_clear = subparsers.add_parser('clear', help='remove the cache')
+    sp_clear.set_defaults(dispatch=cache_clear)
+
+    sp_rebuild = subparsers.add_parser('rebuild', help='re-parse all files and rebuild the cache')
+    sp_rebuild.set_defaults(dispatch=cache_rebuild)
+
+    sp_info = subparsers.add_parser('info', help='show cache status')
+    sp_info.set_defaults(dispatch=cache_info)
+
+    for sp in [sp_clear, sp_rebuild, sp_info]:
+        sp.add_argument('experiment', type=str)
+        sp.add_argument('subjects', nargs='*', type=str, default=None)
+
+    args = parser.parse_args()
+
+    exp = ct.Experiment.load_from_path(args.experiment)
+    subjects = list(filter(lambda s: len(s), args.subjects)) or list(exp.subjects)
+    args.dispatch(exp, subjects, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,11 +11,13 @@ import fnmatch
 from datetime import date
 import time
 
+from colortilt.io import read_data
+
 
 def main():
     data = sys.argv[1]
     subject = sys.argv[2]
-    df = pd.read_csv(data, skipinitialspace=True)
+    df = read_data([data])
     df['subject'] = subject
     df['size'] = float(sys.argv[3])
 
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import sys
+
+from colortilt.io import read_data, write_data
+from colortilt.tools.ellipse import ellipse_arguments, fit_ellipse_groups
+from colortilt.tools.stream import format_arguments
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CT - Analysis')
+    parser.add_argument('data', type=str, nargs='?', default='-')
+    ellipse_arguments(parser)
+    format_arguments(parser)
+
+    args = parser.parse_args()
+    df = read_data([args.data])
+
+    x = fit_ellipse_groups(df, args)
+    write_data(x, fmt=args.format)
+
+    return 0
+
+if __name__ == '__main__':
+    ret = main()
+    sys.exit(ret)
@@ -3,25 +3,14 @@ from __future__ import print_function
 from __future__ import division
 
 import colortilt as ct
-from colortilt.io import read_data
+from colortilt.io import write_data
+from colortilt.tools.load import load_arguments, load, load_subjects, add_shifts, select_subjects
+from colortilt.tools.stream import format_arguments
 
-import pandas as pd
-import numpy as np
 import argparse
+import csv
 import sys
-
-
-def calc_angle_shift(phi, baseline, input_is_radiants=False):
-    # control is -1, make it 0
-    if baseline == -1:
-        baseline = 0
-    if input_is_radiants:
-        phi = phi/np.pi*180.0
-        baseline = baseline/np.pi*180.0
-    shift = float(phi - baseline)
-    shift += (shift >  180.0) * -360
-    shift += (shift < -180.0) *  360
-    return shift
+import os
 
 
 def is_experiment_file(path):
@@ -44,35 +33,86 @@ def check_args(args):
         ok = False
     return True
 
+
+def ingest(exp, subjects, args):
+    store = args.store or exp.store_path
+    manifest = exp.manifest(args.manifest)
+    have_store = os.path.exists(store)
+
+    if have_store != (len(manifest) > 0):
+        print('[E] store %s and manifest %s are out of sync, remove both to start over' % (store, manifest.path),
+              file=sys.stderr)
+        sys.exit(-1)
+
+    todo = {}
+    changed = []
+    for subject in subjects:
+        files = exp.result_file_list(subject, filterfn=args.fnfilter)
+        new, modified = manifest.check(subject, files)
+        changed += modified
+        if len(new):
+            todo[subject] = new
+
+    if len(changed):
+        print('[E] already ingested files were modified or removed, a full reload is needed:', file=sys.stderr)
+        print('\n'.join('\t' + f for f in changed), file=sys.stderr)
+        sys.exit(-1)
+
+    if len(todo) == 0:
+        print('[i] no new files', file=sys.stderr)
+        if len(manifest):
+            manifest.save()  # keep mtimes of touched files
+        return
+
+    new_files = set(f for files in todo.values() for f in files)
+    print('[i] ingesting %d new files' % len(new_files), file=sys.stderr)
+    df = load_subjects(exp, [s for s in subjects if s in todo], lambda f: f in new_files, args)
+    df = add_shifts(df)
+
+    if have_store:
+        with open(store) as fd:
+            header = next(csv.reader(fd))
+        if set(header) != set(df.columns):
+            print('[E] columns of store %s do not match' % store, file=sys.stderr)
+            sys.exit(-1)
+        df = df[header]
+
+    df.to_csv(store, mode='a', header=not have_store, index=False)
+
+    for subject in sorted(todo):
+        for f in todo[subject]:
+            manifest.add(subject, f)
+    manifest.save()
+
+
 def main():
     parser = argparse.ArgumentParser(description='CT - Analysis')
-    parser.add_argument('--data', nargs='+', type=str)
-    parser.add_argument('--exclude-files', dest='fnfilter', type=str)
-    parser.add_argument('experiment', nargs='?', type=str, default=None)
-    parser.add_argument('subjects', nargs='*', type=str, default=None)
-    args = parser.parse_args()
+    load_arguments(parser)
+    parser.add_argument('--incremental', default=False, action='store_true',
+                        help='only append trials of new files to the csv store')
+    parser.add_argument('--store', type=str, default=None,
+                        help='csv store of --incremental (default: beside the experiment file)')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='manifest of ingested files (default: beside the experiment file)')
+    format_arguments(parser)
+    # options may come between the experiment and the subjects (python >= 3.7)
+    args = getattr(parser, 'parse_intermixed_args', parser.parse_args)()
 
     args_ok = check_args(args)
     if not args_ok:
         parser.print_help(sys.stderr)
         sys.exit(-1)
 
-    if args.experiment:
+    if args.incremental:
+        if not args.experiment:
+            sys.stderr.write('--incremental needs an experiment\n')
+            sys.exit(-1)
         exp = ct.Experiment.load_from_path(args.experiment)
+        ingest(exp, select_subjects(exp, args), args)
+        return
 
-        subjects = filter(lambda s: len(s), args.subjects) or exp.subjects
-        print('[i] subjects: ' + ' '.join(subjects), file=sys.stderr)
-        dfs = map(lambda subject: exp.load_result_data(subject, args.fnfilter), subjects)
-        df = pd.concat(dfs, ignore_index=True)
-    else:
-        df = read_data(args.data)
-        df['subject'] = 'data'
-
-    df.rename(columns={'fg': 'fg_abs'}, inplace=True)
-    df['shift'] = df['phi'].combine(df['fg_abs'], calc_angle_shift)
-    df['fg'] = df['fg_abs'].combine(df['bg'], calc_angle_shift)
-
-    df.to_csv(sys.stdout, index=False)
+    df = load(None, args)
+    write_data(df, fmt=args.format)
 
 
 if __name__ == "__main__":
@@ -3,35 +3,52 @@ from __future__ import print_function
 from __future__ import division
 
 import argparse
+import math
 import sys
-import itertools
 
 import numpy as np
 import pandas as pd
 
 from colortilt.io import read_data
+from colortilt.tables import size_table
+from colortilt.tools.spread import calc_spread, max_spread
 
-index = {x: idx for idx, x in enumerate(itertools.permutations([160, 40, 10]))}
 
-def find_oder(df):
+def size_order(df, groups):
+    """Index of the permutation of the sizes sorted by shift for every group
+
+    The index is the position among all permutations of the sizes in
+    descending order (e.g. (160, 40, 10) is 0), as itertools.permutations
+    lists them. Returns the grouping, the permutations that occur (as
+    dict of index -> sizes) and the index of every group.
+    """
     key = 'shift' if 'shift' in df.columns else 'm_mean'
-    k = np.array(df[key]).argsort()
-    idx = tuple(int(df.iloc[l]['size']) for l in k)
-    x = index[idx]
-    #print(df, k, x, idx)
+    gd, sizes, y = size_table(df, groups, key)
+    k = len(sizes)
+    order = np.argsort(y, axis=1, kind='mergesort')
+
+    # lexicographic (Lehmer) rank of the positions in the descending sizes:
+    # digit i counts the later positions that are smaller than position i
+    q = (k - 1) - order
+    later = np.triu(np.ones((k, k), dtype=bool), 1)
+    digits = np.sum((q[:, np.newaxis, :] < q[:, :, np.newaxis]) & later, axis=2)
+    weights = np.array([math.factorial(k - 1 - i) for i in range(k)], dtype=np.int64)
+    idx = np.dot(digits, weights)
 
-    return pd.Series({'order': x})
+    ranks, first = np.unique(idx, return_index=True)
+    perms = {int(r): tuple(sizes[order[i]]) for r, i in zip(ranks, first)}
+    return gd, perms, idx
 
 
 def stats_order(df):
     groups = ['bg', 'fg', 'subject']
 
-    gpd = df.groupby(groups)
-    dfg = gpd.apply(find_oder)
-    x = dfg.reset_index()
+    gd, perms, idx = size_order(df, groups)
+    x = pd.DataFrame({k: gd.key_column(k) for k in groups}, columns=groups)
+    x['order'] = idx
     x.to_csv(sys.stdout, index=False)
 
-    print(index, file=sys.stderr)
+    print({tuple(int(v) for v in perms[i]): i for i in sorted(perms)}, file=sys.stderr)
 
     gpd = x.groupby(['subject', 'order'])
     cnt = gpd.count()
@@ -41,24 +58,6 @@ def stats_order(df):
     s['percent'] = s['percent'].round(1)
     s.to_csv(sys.stdout, index=False)
 
-def find_max(row):
-    upper = np.max(row['shift'])
-    lower = np.min(row['shift'])
-    idx_upper = row['shift'].idxmax()
-    idx_lower = row['shift'].idxmin()
-    size_upper = row.ix[idx_upper]['size']
-    size_lower = row.ix[idx_lower]['size']
-    delta = upper - lower
-    return pd.Series({'spread': delta,
-                      'size_upper': size_upper,
-                      'size_lower': size_lower,
-                      'upper': upper,
-                      'lower': lower})
-
-def max_spread(df):
-    gx = df.groupby(['bg', 'subject'])
-    smax = df.ix[gx.spread.idxmax()]
-    return smax
 
 def main():
     parser = argparse.ArgumentParser(description='CT - Analysis')
@@ -67,15 +66,12 @@ def main():
 
     df = read_data([args.data])
 
-    gpd = df.groupby(['fg', 'bg', 'subject'])
-    x = gpd.apply(find_max)
-    x.reset_index(inplace=True)
+    x = calc_spread(df, ['fg', 'bg', 'subject'], ref=None)
 
     foo = max_spread(x)
     foo.to_csv(sys.stdout, index=False)
 
-    gx = x.groupby(['bg', 'subject'])
-    imax = x.ix[gx.upper.idxmax()]
+    imax = max_spread(x, col='upper')
     imax.to_csv(sys.stdout, index=False)
 
     foo.set_index(['bg', 'subject'])
@@ -8,13 +8,18 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+import json
+import os
+import pickle
+import shutil
 import sys
 from matplotlib.colors import rgb_to_hsv, hsv_to_rgb
-from utils import ggsave
+from utils import ggsave, ggexport
 
 from colortilt.io import read_data
 from colortilt.plot import (angles_to_color, mk_rgb)
-from colortilt.core import GroupedData
+from colortilt.core import GroupedData, make_pool
+from colortilt.cache import RenderCache, table_digest
 
 
 def make_idx2pos():
@@ -68,7 +73,6 @@ class Plotter(object):
         item -= 1
         if self.figures[item] is None:
             fig = plt.figure()
-            plt.hold(True)
             self.figures[item] = fig
 
         return self.figures[item]
@@ -115,7 +119,7 @@ class ShiftPlotter(Plotter):
         group = ['size', 'bg', 'subject']
         if 'size' not in df.columns:
             del group[0]
-        self.gd = GroupedData(df, group)
+        self.gd = GroupedData(df, group, sort_by='fg')
         self.ylim = cargs.ylim or np.max(np.abs(df[column])) * 1.05
         self.is_absolute = any(np.unique(df.fg) > 180.0)
         self.have_negative = any(np.unique(df[self.column]) < 0)
@@ -164,7 +168,6 @@ class ShiftPlotter(Plotter):
     def __call__(self):
 
         for data, context in self.gd.data:
-            data = data.sort('fg')
             _, bg = context['bg']
 
             ax, fig = self.subplot(bg)
@@ -186,17 +189,16 @@ class ShiftPlotter(Plotter):
             return {'color': 'black', 'label': self.column}
         si, s = context['size']
         cs, subject = context['subject']
-        style = self.style_for_size_and_subject(s, subject)
+        style = self.style_for_size_and_subject(s, cs, subject)
         return style
 
     @property
     def subjects(self):
         return self.gd.unique('subject')
 
-    def style_for_size_and_subject(self, size, subject):
+    def style_for_size_and_subject(self, size, cur_subject, subject):
         n_subjects = len(self.subjects)
         color = color_for_size(size, style=self.cargs.color)
-        cur_subject = self.subjects.index(subject)
         label = size_to_label(size) if cur_subject == 0 else "_" + subject
 
         if n_subjects > 1:
@@ -250,35 +252,53 @@ class CompareShiftPlotter(ShiftPlotter):
         plt.errorbar(df['fg'], df['oshift'], yerr=df['oerr'], label='Klauke & Wachtler 2015', color='k')
 
 
+def session_curves(df):
+    """fg and shift of every complete session as (sessions, 8) arrays, its bg and its label"""
+    gd = GroupedData(df, ['subject', 'size', 'date', 'side', 'bg'], sort_by='fg')
+    complete = gd.sizes == 8
+    for i in np.flatnonzero(~complete):
+        print('skipping %s' % str(gd.key(i)[2]), file=sys.stderr)
+    rows = gd.offsets[:-1][complete, np.newaxis] + np.arange(8)
+    labels = ['%s %s' % (date, side) for date, side in
+              zip(gd.key_column('date')[complete], gd.key_column('side')[complete])]
+    return gd.column('fg')[rows], gd.column('shift')[rows], gd.key_column('bg')[complete], labels
+
+
 def plot_shifts_individual(df, cargs):
-    gd = GroupedData(df, ['subject', 'size', 'date', 'side', 'bg'])
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
 
+    fg, shift, session_bg, labels = session_curves(df)
     fig = plt.figure()
     pos_idx = make_idx2pos()
     max_shift = np.max(np.abs(df['shift'])) * 1.05
+    colors = plt.rcParams['axes.prop_cycle'].by_key().get('color', ['k'])
 
-    for data, context in gd.data:
-        subject, size, date, side, bg = context.group
-        if len(data) != 8:
-            print('skipping %s' % (str(date)), file=sys.stderr)
-            continue
+    for bg in sorted(set(session_bg)):
+        sessions = np.flatnonzero(session_bg == bg)
+        if cargs.max_sessions and len(sessions) > cargs.max_sessions:
+            pick = np.linspace(0, len(sessions) - 1, cargs.max_sessions).round().astype(np.int64)
+            sessions = sessions[pick]
 
         ax = plt.subplot(3, 3, pos_idx[bg])
+        ax.axhline(y=0, color='#777777')
+        ax.axvline(x=0, color='#777777')
+
+        alpha = cargs.alpha if cargs.alpha is not None else min(1.0, 20.0 / len(sessions))
+        segments = np.stack([fg[sessions], shift[sessions]], axis=-1)
+        seg_colors = [colors[i % len(colors)] for i in range(len(sessions))]
+        ax.add_collection(LineCollection(segments, colors=seg_colors, alpha=alpha))
+        ax.set_xlim([-180, 180])
+        ax.set_ylim([-1*max_shift, max_shift])
 
-        plt.axhline(y=0, color='#777777')
-        plt.axvline(x=0, color='#777777')
-        date = str(np.unique(data['date']))
-        side = str(np.unique(data['side']))
-        x = data.sort(['fg'])
-        plt.plot(x['fg'], x['shift'], label="%s %s" % (date, side))
-        plt.xlim([-180, 180])
-        plt.ylim([-1*max_shift, max_shift])
-        if pos_idx[bg] in [3, 6]:
-            plt.legend(loc=4, fontsize=6)
+        if pos_idx[bg] in [3, 6] and len(sessions) <= 10:
+            handles = [Line2D([], [], color=c) for c in seg_colors]
+            ax.legend(handles, [labels[i] for i in sessions], loc=4, fontsize=6)
 
         ax.annotate(u"%4d°" % int(bg), xy=(.05, .95),  xycoords='axes fraction',
                     horizontalalignment='left', verticalalignment='top',
                     fontsize=18, family='Input Mono', color=angles_to_color([bg])[0])
+    setattr(fig, 'name', 'shift_sessions_' + make_subject_string(df['subject'].unique()))
     return [fig]
 
 def plot_shifts_bgavg(df, args):
@@ -350,7 +370,7 @@ def plot_delta(df, cargs):
     return [fig]
 
 def plot_delta_combined(df, cargs):
-    dfc_group = df.groupby(['bg'])
+    dfc_group = df.groupby('bg')
 
     plot = Plotter(cargs, 1, 2)
 
@@ -384,8 +404,7 @@ def plot_delta_combined(df, cargs):
     ax, fig = plot.subplot(2, polar=True)
     setattr(fig, 'name', 'scat-polar')
 
-    plt.hold()
-    plt.scatter(map(lambda x: x/180.0*np.pi, bgs), np.abs(slope), c=colors, s=40, marker='o')
+    plt.scatter(np.asarray(bgs, dtype=np.float64)/180.0*np.pi, np.abs(slope), c=colors, s=40, marker='o')
     ax.set_rmax(np.max(np.abs(slope))*1.05)
 
     return plot.figures
@@ -398,7 +417,6 @@ def plot_sizerel(df, cargs):
     bgs = sorted(df['bg'].unique())
 
     colors = angles_to_color(bgs)
-    fig.hold()
 
     y_max = np.max([df['m_plus'].max(), np.abs(df['m_minus'].min())]) * 1.05
 
@@ -432,7 +450,6 @@ def plot_sizerel_combined(df, cargs):
     bgs = sorted(df['bg'].unique())
 
     colors = angles_to_color(bgs)
-    fig.hold()
 
     y_max = cargs.ylim or np.max(np.abs(df['m_mean'])) * 1.10
 
@@ -492,16 +509,14 @@ def plot_spread_polar(df, args):
     key = 'spread' if 'spread' in df.columns else 'slope_mean_abs'
 
     plotter = Plotter(args, 1, 1)
-    df = df[df.bg != -1] # filter out control
-    df.sort(['bg'], inplace=True)
+    df = df[df.bg != -1].sort_values('bg') # filter out control
     ax, fig = plotter.subplot(1, polar=True)
     bgs = df['bg']
     colors = angles_to_color(bgs)
-    theta = np.array(map(lambda x: x/180.0*np.pi, bgs))
+    theta = np.asarray(bgs, dtype=np.float64)/180.0*np.pi
     rho = np.array(df[key])
     theta, rho = zip(*map(mirror_if_neg, zip(theta, rho)))
     x, y = pol2cart(theta, rho)
-    plt.hold(True)
     try:
         from colortilt.ellipse import fit_ellipse, get_parameters, create_ellipse
         a = fit_ellipse(theta, rho)
@@ -537,8 +552,7 @@ def scatter_spread(df, args):
     from scipy import stats
 
     plotter = Plotter(args, 1, 1)
-    df = df[df.bg != -1] # filter out control
-    df.sort(['bg'], inplace=True)
+    df = df[df.bg != -1].sort_values('bg') # filter out control
     colors = angles_to_color(df['bg'])
     ax, fig = plotter.subplot(1, polar=False)
     x, y = df['ref'], df['spread']
@@ -549,16 +563,14 @@ def scatter_spread(df, args):
     px = np.arange(-5, np.max(np.abs(x))*1.2, 0.5)
     py = np.polyval(p, px)
     plt.plot(px, py, label='fit', color="#999999")
-    plt.hold(True)
     plt.scatter(x, y, c=colors, s=50, marker='o')
     plt.xlabel('induction @ ' + size_to_label(40))
     plt.ylabel('max spread')
+    setattr(fig, 'name', 'spread_scatter_' + make_subject_string(df['subject'].unique()))
     return plotter.figures
 
 
-def main():
-    parser = argparse.ArgumentParser(description='CT - Analysis')
-    parser.add_argument('data', type=str, nargs='?', default='-')
+def plot_arguments(parser):
     parser.add_argument('--single', action='store_true', default=False)
     parser.add_argument('--style', nargs='*', type=str, default=['ck'])
     parser.add_argument('--color', default='seq_bmr', type=str)
@@ -572,14 +584,29 @@ def main():
     parser.add_argument('-U', '--unit', dest='unit', type=str, default='cm')
     parser.add_argument('-P', '--path', dest='path', type=str, default=None)
     parser.add_argument('-F', '--filename', dest='filename', type=str, default=None)
+    parser.add_argument('--format', dest='formats', nargs='+', type=str, default=None,
+                        help='save every figure in all these formats, e.g. pdf png svg')
+    parser.add_argument('--size', dest='sizes', nargs='+', type=parse_size, default=None,
+                        help='save every figure in all these sizes (WIDTHxHEIGHT in -U units)')
     parser.add_argument('--scale', default=1, type=float)
     parser.add_argument('--daylight', default=False, action='store_true')
     parser.add_argument('--annotate', default=None)
-    args = parser.parse_args()
-
-    df = read_data([args.data])
-    print(df, file=sys.stderr)
-
+    parser.add_argument('--max-sessions', dest='max_sessions', default=None, type=int,
+                        help='draw at most this many (evenly picked) sessions per surround')
+    parser.add_argument('--alpha', default=None, type=float,
+                        help='opacity of the session curves (default: by their number)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='render and save the figures headless (Agg) in a pool of processes (0: all cores)')
+    parser.add_argument('--cache', default=os.environ.get('CT_PLOT_CACHE'), type=str,
+                        help='directory of the render cache for -S (default: $CT_PLOT_CACHE)')
+    parser.add_argument('--cache-size', dest='cache_size', default=1024, type=float,
+                        help='maximal size of the render cache in MB')
+    parser.add_argument('--cache-link', dest='cache_link', default=False, action='store_true',
+                        help='hard link cached files instead of copying them')
+    parser.add_argument('--no-cache', dest='cache', action='store_const', const=None)
+
+
+def make_figures(df, args):
     plt.style.use(args.style)
 
     if 'shift' in df.columns and 'N' not in df.columns:
@@ -617,13 +644,167 @@ def main():
     else:
         raise ValueError('Unknown data set')
 
+    return fig
+
+
+def parse_size(text):
+    """WIDTHxHEIGHT, e.g. 24.7x13.7, as a (width, height) tuple"""
+    try:
+        width, height = [float(x) for x in text.lower().split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('size must be WIDTHxHEIGHT, not %r' % text)
+    return width, height
+
+
+def export_mode(args):
+    return bool(args.formats or args.sizes)
+
+
+def figure_outputs(fig, args):
+    """(filename, format, width, height) of every file to write for fig"""
+    name = args.filename or getattr(fig, 'name', None)
+    name = name.replace(': ', '_') if name else str(hash(fig))
+    base, ext = os.path.splitext(name)
+    if ext[1:].lower() not in fig.canvas.get_supported_filetypes():
+        base, ext = name, ''
+    formats = args.formats or [ext[1:].lower() or 'pdf']
+    sizes = args.sizes or [(args.width, args.height)]
+    outputs = []
+    for width, height in sizes:
+        suffix = '_%gx%g' % (width, height) if len(sizes) > 1 else ''
+        for fmt in formats:
+            filename = base + suffix + '.' + fmt
+            outputs.append((os.path.join(args.path, filename) if args.path else filename, fmt, width, height))
+    return outputs
+
+
+def save_figure(fig, outputs, kwargs, jobs=1):
+    """ggsave fig, or with outputs, ggexport it with raster encoding in jobs threads"""
+    if outputs is None:
+        ggsave(plot=fig, **kwargs)
+        return
+    from multiprocessing.pool import ThreadPool
+    import multiprocessing
+
+    jobs = jobs or multiprocessing.cpu_count()
+    pool = ThreadPool(jobs) if jobs > 1 else None
+    try:
+        ggexport(fig, outputs, units=kwargs['units'], scale=kwargs['scale'], dpi=kwargs['dpi'], pool=pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+class SaveFigure(object):
+    """Picklable save_figure of a pickled figure, e.g. for multiprocessing.Pool.map
+
+    Called with (figure, outputs), the figure is unpickled and rendered
+    with the Agg backend in the process that saves it.
+    """
+
+    def __init__(self, jobs=1, **kwargs):
+        self.jobs = jobs
+        self.kwargs = kwargs
+
+    def __call__(self, item):
+        data, outputs = item
+        plt.switch_backend('agg')
+        save_figure(pickle.loads(data), outputs, self.kwargs, self.jobs)
+
+
+def batch_mode(args):
+    return args.save and args.jobs != 1
+
+
+def output_figures(fig, args):
     if args.save:
-        for f in fig:
-            ggsave(plot=f, filename=args.filename, path=args.path,
-                   width=args.width, height=args.height, units=args.unit,
-                   dpi=600, scale=args.scale)
+        kwargs = dict(filename=args.filename, path=args.path,
+                      width=args.width, height=args.height, units=args.unit,
+                      dpi=600, scale=args.scale)
+        outputs = [figure_outputs(f, args) if export_mode(args) else None for f in fig]
+        pool = make_pool(args.jobs) if batch_mode(args) and len(fig) > 1 else None
+        if pool is None:
+            for f, out in zip(fig, outputs):
+                save_figure(f, out, kwargs, args.jobs)
+            return
+        try:
+            data = [pickle.dumps(f, pickle.HIGHEST_PROTOCOL) for f in fig]
+            for f in fig:
+                plt.close(f)
+            pool.map(SaveFigure(**kwargs), list(zip(data, outputs)), chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
     else:
         plt.show()
 
+
+# the arguments that change the saved figures (and their names)
+RENDER_ARGS = ['single', 'style', 'color', 'legend', 'no_title', 'ylim', 'vertical',
+               'height', 'width', 'unit', 'filename', 'scale', 'daylight', 'max_sessions', 'alpha',
+               'formats', 'sizes']
+RENDER_VERSION = 1
+
+
+def render_key(df, args):
+    """Key of the figures for the data and arguments in the render cache"""
+    import matplotlib
+
+    options = {k: getattr(args, k) for k in RENDER_ARGS}
+    parts = [RENDER_VERSION, matplotlib.__version__, json.dumps(options, sort_keys=True), table_digest(df)]
+    for style in args.style:
+        if os.path.isfile(style):
+            with open(style, 'rb') as fd:
+                parts.append(fd.read())
+    if args.annotate:
+        parts.append(table_digest(read_data([args.annotate])))
+    return RenderCache.make_key(*parts)
+
+
+def render_cache(args):
+    """The render cache, if figures are saved (under their own names) and it is enabled"""
+    if not args.save or not args.cache or (args.filename and os.path.dirname(args.filename)):
+        return None
+    return RenderCache(args.cache, max_size=int(args.cache_size * 1024 * 1024), link=args.cache_link)
+
+
+def render(df, args):
+    if batch_mode(args):
+        plt.switch_backend('agg')
+    fig = make_figures(df, args)
+    output_figures(fig, args)
+
+
+def plot(df, args):
+    print(df, file=sys.stderr)
+    cache = render_cache(args)
+    if cache is None:
+        render(df, args)
+        return
+
+    key = render_key(df, args)
+    if not cache.has(key):
+        staging = cache.staging()
+        try:
+            render(df, argparse.Namespace(**dict(vars(args), path=staging)))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        cache.store(key, staging)
+    else:
+        print('[I] render cache hit: %s' % key, file=sys.stderr)
+    cache.restore(key, args.path or os.curdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CT - Analysis')
+    parser.add_argument('data', type=str, nargs='?', default='-')
+    plot_arguments(parser)
+    args = parser.parse_args()
+
+    df = read_data([args.data])
+    plot(df, args)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+import os
+os.environ.setdefault('MPLBACKEND', 'agg')
+
+import argparse
+import json
+import shlex
+import shutil
+import sys
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from colortilt.cache import RenderCache, table_digest
+from colortilt.pipeline import Pipeline, register_plot
+from colortilt.core import make_pool
+
+# The standard analyses of a report as (name, chain of ct-run stages,
+# arguments of the plot stage or None). Every analysis is done for every
+# subject and for all subjects combined; COHORT only for the latter.
+
+ANALYSES = [
+    ('shift', 'ana -C', '-W 60 -H 40 --ylim 35'),
+    ('duration', 'ana -C --col duration', '-W 60 -H 40'),
+    ('shift-abs', 'filter --no-control | ana -C | conv rel2abs | conv abs-shift',
+     '--vertical -W 20 -H 60 --ylim 35'),
+    ('shift-mean-abs', 'conv rel2abs | ana -C -M', '--ylim 20'),
+    ('shift-mean', 'ana -C -M', '--ylim 20'),
+    ('spread', 'filter --no-control | conv rel2abs | ana -C | conv abs-shift | spread',
+     '--ylim 20 --vertical -W 20 -H 60'),
+    ('max-spread', 'filter --no-control | ana -C | conv abs-shift | spread --max-spread', '--ylim 25'),
+    ('ellipse', 'filter --no-control | ana -C | conv abs-shift | spread --max-spread | ellipse', None),
+    ('fit', 'ana | fit', None),
+]
+
+COHORT = [
+    ('sizerel', 'ana | sizerel', '-W 20 -H 32'),
+    ('sizerel-pos', "filter --fg-sign=+ | ana | sizerel", '-W 20 -H 32'),
+    ('sizerel-neg', "filter --fg-sign=- | ana | sizerel", '-W 20 -H 32'),
+    ('sizerel-spread', 'filter --no-control | ana -C | conv abs-shift | spread --sizerel', '-W 20 -H 32'),
+    ('slope', 'filter --no-control | ana -C | conv abs-shift | spread --sizerel | slope size', ''),
+    ('scat', 'ana -C | scat', '-W 32 -H 20'),
+]
+
+REPORT_VERSION = 1
+COMBINED = 'all'
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class ReportItem(object):
+    """Picklable run of one analysis of a report, e.g. for multiprocessing.Pool.map
+
+    Called with (directory, chain, plot, style, df) it runs the chain on df,
+    writes the result as result.csv and, if plot is not None, saves the
+    figures into directory; everything the tools print to stderr goes
+    to log.txt. Returns the names of the files and the error, if any.
+    """
+
+    def __call__(self, item):
+        directory, chain, plot, style, df = item
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+        error = None
+        stderr = sys.stderr
+        with open(os.path.join(directory, 'log.txt'), 'w') as log:
+            sys.stderr = log
+            try:
+                x = Pipeline.from_args(shlex.split(chain))(df.copy())
+                x.to_csv(os.path.join(directory, 'result.csv'), index=False)
+                if plot is not None:
+                    argv = shlex.split(plot) + ['--style', style, '-S', '-P', directory, '--no-cache']
+                    Pipeline().add('plot', argv)(x)
+            except SystemExit:
+                error = 'invalid arguments'
+                print('[E] ' + error, file=log)
+            except Exception as e:
+                error = '%s: %s' % (type(e).__name__, e)
+                print('[E] ' + error, file=log)
+            finally:
+                sys.stderr = stderr
+        files = sorted(f for f in os.listdir(directory) if f != 'log.txt')
+        return files, error
+
+
+def report_items(df, subjects):
+    """(target, name, chain, plot, data) of every analysis of the report"""
+    targets = [(s, df[df['subject'] == s]) for s in subjects]
+    if len(subjects) > 1:
+        targets.append((COMBINED, df))
+    items = []
+    for target, data in targets:
+        analyses = ANALYSES + (COHORT if target == COMBINED else [])
+        items += [(target, name, chain, plot, data) for name, chain, plot in analyses]
+    return items
+
+
+def style_bytes(style):
+    if not os.path.isfile(style):
+        return style
+    with open(style, 'rb') as fd:
+        return fd.read()
+
+
+def item_key(item, style):
+    import matplotlib
+
+    target, name, chain, plot, data = item
+    return RenderCache.make_key(REPORT_VERSION, matplotlib.__version__, chain, plot, style_bytes(style),
+                                table_digest(data))
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as fd:
+            return json.load(fd)
+    except ValueError:
+        return {}
+
+
+def write_index(path, manifest, items):
+    targets = []
+    for target, name, _, _, _ in items:
+        if target not in targets:
+            targets.append(target)
+
+    out = [u'<!DOCTYPE html>', u'<html><head><meta charset="utf-8"><title>colortilt report</title>',
+           u'<style>body{font-family:sans-serif} td{padding:2px 8px;vertical-align:top} '
+           u'.failed{color:#c00}</style></head><body>', u'<h1>colortilt report</h1>',
+           u'<p>%s</p>' % escape(time.strftime('%Y-%m-%d %H:%M'))]
+    for target in targets:
+        out.append(u'<h2>%s</h2><table>' % escape(target))
+        for t, name, _, _, _ in items:
+            if t != target:
+                continue
+            entry = manifest['%s/%s' % (t, name)]
+            links = [u'<a href=%s>%s</a>' % (quoteattr('%s/%s/%s' % (t, name, f)), escape(f))
+                     for f in entry['files'] + ['log.txt']]
+            status = u'<span class="failed">%s</span>' % escape(entry['error']) if entry['error'] else u'ok'
+            out.append(u'<tr><td>%s</td><td>%s</td><td>%s</td></tr>' % (escape(name), status, u'<br>'.join(links)))
+        out.append(u'</table>')
+    out.append(u'</body></html>')
+    with open(path, 'wb') as fd:
+        fd.write(u'\n'.join(out).encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CT - render all analyses and figures into a report')
+    parser.add_argument('experiment', type=str)
+    parser.add_argument('subjects', nargs='*', type=str, default=None)
+    parser.add_argument('-o', '--output', type=str, default='report')
+    parser.add_argument('--style', type=str, default=os.path.join(HERE, 'ck.mplstyle'),
+                        help='matplotlib style of the figures')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes used for the analyses (0: all cores)')
+    parser.add_argument('--force', default=False, action='store_true',
+                        help='redo all analyses, even if their input did not change')
+    args = parser.parse_args()
+
+    register_plot()
+    load = Pipeline().add('load', ['-j', str(args.jobs), args.experiment] + args.subjects)
+    df = load()
+    subjects = sorted(df['subject'].unique())
+
+    manifest_path = os.path.join(args.output, 'report.json')
+    manifest = {} if args.force else load_manifest(manifest_path)
+    items = report_items(df, subjects)
+
+    todo = []
+    for item in items:
+        target, name = item[:2]
+        key = item_key(item, args.style)
+        entry = manifest.get('%s/%s' % (target, name))
+        directory = os.path.join(args.output, target, name)
+        if entry is not None and entry['key'] == key and not entry['error'] and \
+           all(os.path.exists(os.path.join(directory, f)) for f in entry['files']):
+            continue
+        todo.append((item, key, directory))
+
+    print('[I] report: %d of %d analyses to do' % (len(todo), len(items)), file=sys.stderr)
+    work = [(directory, item[2], item[3], args.style, item[4]) for item, _, directory in todo]
+    pool = make_pool(args.jobs) if len(todo) > 1 else None
+    try:
+        run = ReportItem()
+        results = pool.map(run, work, chunksize=1) if pool is not None else [run(w) for w in work]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    for (item, key, _), (files, error) in zip(todo, results):
+        target, name = item[:2]
+        manifest['%s/%s' % (target, name)] = {'key': key, 'files': files, 'error': error}
+        if error:
+            print('[W] %s/%s: %s' % (target, name, error), file=sys.stderr)
+
+    with open(manifest_path, 'w') as fd:
+        json.dump(manifest, fd, indent=1, sort_keys=True)
+    write_index(os.path.join(args.output, 'index.html'), manifest, items)
+    return 0
+
+
+if __name__ == '__main__':
+    ret = main()
+    sys.exit(ret)
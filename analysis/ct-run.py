@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+import shlex
+import sys
+
+from colortilt.pipeline import Pipeline, STAGES, register_plot
+
+
+def usage():
+    print('usage: ct-run.py STAGE [ARGS] [| STAGE [ARGS]] ...', file=sys.stderr)
+    print('\nRun a chain of ct tools in one process, the | separator must be', file=sys.stderr)
+    print('quoted or the whole chain given as a single argument, e.g.', file=sys.stderr)
+    print('  ct-run.py "load exp.experiment | filter --size 40 | ana | plot"\n', file=sys.stderr)
+    print('stages:', file=sys.stderr)
+    for name in sorted(STAGES):
+        print('  %-8s %s' % (name, STAGES[name].help or ''), file=sys.stderr)
+
+
+def main():
+    argv = sys.argv[1:]
+    if len(argv) == 1:
+        argv = shlex.split(argv[0])
+
+    register_plot()
+
+    if len(argv) == 0 or argv[0] in ['-h', '--help']:
+        usage()
+        return 0
+
+    pipeline = Pipeline.from_args(argv)
+    if not pipeline.steps[0][0].source:
+        pipeline.steps.insert(0, (STAGES['read'], STAGES['read'].parse_args([])))
+    if not pipeline.steps[-1][0].sink:
+        pipeline.add('write')
+
+    pipeline()
+    return 0
+
+
+if __name__ == '__main__':
+    ret = main()
+    sys.exit(ret)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests import colortilt (and the tools) from the analysis directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
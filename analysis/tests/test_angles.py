@@ -0,0 +1,54 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+from colortilt.angles import angle_shift, calc_angle_shift
+
+
+EDGES = [-360.0, -270.0, -180.0, -179.5, -1.0, 0.0, 1.0, 179.5, 180.0, 270.0, 360.0, 540.0]
+
+
+def reference(phi, baseline, input_is_radiants=False):
+    return np.array([calc_angle_shift(p, b, input_is_radiants) for p, b in zip(phi, baseline)])
+
+
+def test_edge_cases():
+    phi, baseline = [np.array(x).ravel() for x in np.meshgrid(EDGES, EDGES + [-1.0])]
+    np.testing.assert_array_equal(angle_shift(phi, baseline), reference(phi, baseline))
+
+
+def test_equal_angles():
+    # -1 is the control baseline, see test_control_baseline
+    phi = np.array([x for x in EDGES if x != -1.0])
+    np.testing.assert_array_equal(angle_shift(phi, phi), np.zeros(len(phi)))
+
+
+def test_half_turn():
+    # +-180 stays where it is, one more turn is wrapped to it
+    np.testing.assert_array_equal(angle_shift([180.0, -180.0, 540.0, 0.0], [0.0, 0.0, 0.0, 180.0]),
+                                  [180.0, -180.0, 180.0, -180.0])
+
+
+def test_control_baseline():
+    phi = np.array([-170.0, 10.0, 200.0])
+    np.testing.assert_array_equal(angle_shift(phi, np.full(3, -1.0)), angle_shift(phi, np.zeros(3)))
+
+
+def test_random_wrapped():
+    rng = np.random.RandomState(4)
+    phi = rng.uniform(-720, 720, 10000)
+    baseline = np.where(rng.rand(10000) < 0.1, -1.0, rng.uniform(0, 360, 10000))
+    np.testing.assert_allclose(angle_shift(phi, baseline), reference(phi, baseline), rtol=0, atol=1e-9)
+
+
+def test_radians():
+    rng = np.random.RandomState(5)
+    phi = rng.uniform(-2 * np.pi, 2 * np.pi, 1000)
+    baseline = rng.uniform(0, 2 * np.pi, 1000)
+    np.testing.assert_allclose(angle_shift(phi, baseline, True), reference(phi, baseline, True),
+                               rtol=0, atol=1e-9)
+
+
+def test_nan():
+    res = angle_shift([np.nan, 10.0], [0.0, np.nan])
+    assert np.isnan(res).all()
@@ -0,0 +1,125 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from colortilt.cache import ResultCache
+from colortilt.core import Experiment, READ_OPTIONS
+
+COLUMNS = ['size', 'bg', 'fg', 'phi_start', 'phi', 'side', 'duration']
+
+
+def write_session(path, seed, trials=24):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'size': rng.choice([10, 40, 160], trials),
+                       'bg': rng.choice([-1, 0, 45, 90], trials),
+                       'fg': rng.uniform(0, 360, trials).round(1),
+                       'phi_start': rng.uniform(0, 360, trials).round(3),
+                       'phi': rng.uniform(0, 360, trials).round(3),
+                       'side': rng.choice(['l', 'r'], trials),
+                       'duration': rng.uniform(0.5, 5, trials).round(5)},
+                      columns=COLUMNS)
+    df.to_csv(path, index=False)
+
+
+def sessions(tmpdir, n=3):
+    names = [str(tmpdir.join('2015010%dT120%d.dat' % (k + 1, k))) for k in range(n)]
+    for k, name in enumerate(names):
+        write_session(name, k)
+    return names
+
+
+def experiment(tmpdir):
+    for i, subject in enumerate(['s0', 's1']):
+        data = tmpdir.join('data', subject)
+        data.ensure(dir=True)
+        for k in range(3):
+            write_session(str(data.join('2015010%dT120%d.dat' % (k + 1, k))), 10 * i + k)
+    return Experiment({'data-path': 'data'}, str(tmpdir.join('test.experiment')))
+
+
+def test_cached_frame(tmpdir):
+    names = sessions(tmpdir)
+    path = str(tmpdir.join('cache.npz'))
+    plain = [pd.read_csv(f, **READ_OPTIONS) for f in names]
+
+    cache = ResultCache(path)
+    for f, df in zip(names, plain):
+        pdt.assert_frame_equal(cache.read_csv(f, **READ_OPTIONS), df)
+    cache.save()
+
+    cache = ResultCache(path)
+    assert all(cache.is_valid(f, READ_OPTIONS) for f in names)
+    for f, df in zip(names, plain):
+        pdt.assert_frame_equal(cache.read_csv(f, **READ_OPTIONS), df)
+
+
+def test_touched_file(tmpdir):
+    names = sessions(tmpdir)
+    path = str(tmpdir.join('cache.npz'))
+    cache = ResultCache(path)
+    for f in names:
+        cache.read_csv(f, **READ_OPTIONS)
+    cache.save()
+
+    write_session(names[1], 99)
+    st = os.stat(names[1])
+    os.utime(names[1], (st.st_atime, st.st_mtime + 10))
+    cache = ResultCache(path)
+    assert [f for f in names if not cache.is_valid(f, READ_OPTIONS)] == [names[1]]
+    pdt.assert_frame_equal(cache.read_csv(names[1], **READ_OPTIONS), pd.read_csv(names[1], **READ_OPTIONS))
+    assert cache.is_valid(names[1], READ_OPTIONS)
+
+
+def test_parser_options(tmpdir):
+    name = sessions(tmpdir, 1)[0]
+    path = str(tmpdir.join('cache.npz'))
+
+    cache = ResultCache(path)
+    default = cache.read_csv(name)
+    cache.save()
+
+    cache = ResultCache(path)
+    assert cache.is_valid(name)
+    assert not cache.is_valid(name, {'float_precision': 'round_trip'})
+    exact = cache.read_csv(name, float_precision='round_trip')
+    pdt.assert_frame_equal(exact, pd.read_csv(name, float_precision='round_trip'))
+    assert not cache.is_valid(name)
+    pdt.assert_frame_equal(cache.read_csv(name), default)
+
+
+def test_load_cached(tmpdir):
+    exp = experiment(tmpdir)
+    subjects = ['s0', 's1']
+    plain = exp.load_subjects_data(subjects, use_cache=False)
+
+    pdt.assert_frame_equal(exp.load_subjects_data(subjects), plain)  # builds the cache
+    assert exp.result_cache('s0').stale(exp.result_file_list('s0'), READ_OPTIONS) == []
+    pdt.assert_frame_equal(exp.load_subjects_data(subjects), plain)  # from the cache
+
+    pool = ThreadPool(2)
+    try:
+        exp.result_cache('s1').clear()
+        pdt.assert_frame_equal(exp.load_subjects_data(subjects, pool=pool), plain)
+        pdt.assert_frame_equal(exp.load_subjects_data(subjects, pool=pool), plain)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def test_load_touched_file(tmpdir):
+    exp = experiment(tmpdir)
+    exp.load_subjects_data(['s0'])
+    files = exp.result_file_list('s0')
+
+    write_session(files[1], 99)
+    st = os.stat(files[1])
+    os.utime(files[1], (st.st_atime, st.st_mtime + 10))
+    assert exp.result_cache('s0').stale(files, READ_OPTIONS) == [files[1]]
+
+    pdt.assert_frame_equal(exp.load_subjects_data(['s0']), exp.load_subjects_data(['s0'], use_cache=False))
+    assert exp.result_cache('s0').stale(files, READ_OPTIONS) == []
@@ -0,0 +1,96 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import scipy.optimize
+
+from colortilt.ellipse import (ellipse, ellipse_jacobian, ellipse_shape, fit_ellipses,
+                               to_fit_func)
+from colortilt.pipeline import Pipeline
+
+BG = np.arange(0.0, 360.0, 45.0) / 180.0 * np.pi
+
+
+def old_fit_ellipse(x, y):
+    """The former fit_ellipse: scipy's leastsq from a fixed start"""
+    func = lambda param: to_fit_func(x, y, *list(param))
+    rx, cov_x, infodict, mesg, ier = scipy.optimize.leastsq(func, (10, 15, 20/180*np.pi), full_output=True)
+    return rx, ier in range(1, 5)
+
+
+def synthetic(n, noise, seed):
+    rng = np.random.RandomState(seed)
+    truth = np.stack([rng.uniform(8, 12, n), rng.uniform(13, 20, n), rng.uniform(0, np.pi, n)], axis=-1)
+    y = ellipse(truth[:, 0:1], truth[:, 1:2], truth[:, 2:3], BG)
+    return truth, y + rng.normal(0.0, noise, y.shape)
+
+
+def test_jacobian():
+    rng = np.random.RandomState(18)
+    p = np.stack([rng.uniform(1, 20, 50), rng.uniform(1, 20, 50), rng.uniform(-4, 4, 50)], axis=-1)
+    x = rng.uniform(0, 2 * np.pi, 50)
+    J = ellipse_jacobian(p[:, 0], p[:, 1], p[:, 2], x)
+    h = 1e-6
+    for k in range(3):
+        d = h * (np.arange(3) == k)
+        fd = (ellipse(*(list((p + d).T) + [x])) - ellipse(*(list((p - d).T) + [x]))) / (2 * h)
+        assert np.allclose(J[:, k], fd, rtol=1e-6, atol=1e-8)
+
+
+def test_fit_ellipses_exact():
+    truth, y = synthetic(100, 0.0, 1)
+    y[::7, 3] = np.nan
+    params, cov, converged = fit_ellipses(BG, y)
+    assert converged.all()
+    assert np.all(params[:, :2] > 0) and np.all((0 <= params[:, 2]) & (params[:, 2] < np.pi))
+    grid = np.linspace(0, 2 * np.pi, 73)
+    fitted = ellipse(params[:, 0:1], params[:, 1:2], params[:, 2:3], grid)
+    expected = ellipse(truth[:, 0:1], truth[:, 1:2], truth[:, 2:3], grid)
+    assert np.allclose(fitted, expected, rtol=1e-6)
+    ratio, eccentricity, orientation = ellipse_shape(params)
+    true_ratio, true_eccentricity, true_orientation = ellipse_shape(truth)
+    assert np.allclose(ratio, true_ratio) and np.allclose(eccentricity, true_eccentricity)
+    # orientation is pi-periodic
+    assert np.allclose(np.exp(2j * orientation), np.exp(2j * true_orientation))
+
+
+def test_fit_ellipses_old():
+    truth, y = synthetic(100, 0.5, 2)
+    params, cov, converged = fit_ellipses(BG, y)
+    assert converged.all()
+    grid = np.linspace(0, 2 * np.pi, 73)
+    compared = 0
+    for i in range(len(y)):
+        old, ok = old_fit_ellipse(BG, y[i])
+        if not ok:
+            continue
+        rss_old = np.sum(to_fit_func(BG, y[i], *old)**2)
+        rss_new = np.sum(to_fit_func(BG, y[i], *params[i])**2)
+        assert rss_new <= rss_old * (1 + 1e-8)
+        if np.isclose(rss_new, rss_old, rtol=1e-8):
+            assert np.allclose(ellipse(params[i, 0], params[i, 1], params[i, 2], grid),
+                               ellipse(old[0], old[1], old[2], grid), rtol=1e-5)
+            compared += 1
+    assert compared > 90
+
+
+def spreads(subjects=4, noise=0.5):
+    """Spread over bg of every subject, all from an ellipse with a ratio of 1.5"""
+    rng = np.random.RandomState(19)
+    bg = np.tile(np.arange(0.0, 360.0, 45.0), subjects)
+    spread = ellipse(10.0, 15.0, 0.5, bg / 180.0 * np.pi) + rng.normal(0.0, noise, len(bg))
+    return pd.DataFrame({'bg': bg, 'spread': spread,
+                         'subject': np.repeat(['s%d' % i for i in range(subjects)], 8)})
+
+
+def test_ellipse_bootstrap_jobs():
+    df = spreads()
+    for by in [[], ['--by', '--resample', 'subject']]:
+        args = ['ellipse', '--bootstrap', '300', '--seed', '7'] + by
+        one = Pipeline.from_args(args)(df)
+        two = Pipeline.from_args(args + ['-j', '2'])(df)
+        pdt.assert_frame_equal(one, two)
+        assert (one['resamples'] > 250).all()
+        assert ((one['ratio_low'] <= 1.5) & (1.5 <= one['ratio_high'])).all()
+        assert ((one['orientation_low'] <= 90 + 28.65) & (90 + 28.65 <= one['orientation_high'])).all()
@@ -0,0 +1,46 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+
+from colortilt.io import read_data, write_data
+
+
+def trials():
+    return pd.DataFrame({'size': [10, 40], 'bg': [0.0, 45.0], 'fg': [22.5, -22.5],
+                         'phi': [30.1, 20.7], 'side': ['l', 'r'], 'subject': ['a', 'b'],
+                         'shift': [7.6, 43.2]})
+
+
+def means():
+    return pd.DataFrame({'bg': [0.0, 45.0], 'size': [10, 40], 'fg': [22.5, -22.5],
+                         'N': [10.0, 12.0], 'err': [0.123456789012345, 1.0 / 3.0],
+                         'shift': [5.494300842285156123, 2.0 / 3.0], 'subject': ['a', 'b']})
+
+
+def test_trial_schema(tmpdir):
+    path = str(tmpdir.join('trials.csv'))
+    trials().to_csv(path, index=False)
+    df = read_data([path])
+    assert df['shift'].dtype == np.float32
+    assert df['size'].dtype == np.int16
+
+
+def test_derived_keeps_float64(tmpdir):
+    path = str(tmpdir.join('means.csv'))
+    x = means()
+    x.to_csv(path, index=False)
+    df = read_data([path])
+    for col in ['shift', 'err', 'N', 'bg', 'fg']:
+        assert df[col].dtype == np.float64
+    np.testing.assert_array_equal(df['shift'], x['shift'])
+    np.testing.assert_array_equal(df['err'], x['err'])
+
+
+def test_derived_binary(tmpdir):
+    path = str(tmpdir.join('means.bin'))
+    x = means()
+    write_data(x, path, fmt='bin')
+    df = read_data([path])
+    np.testing.assert_array_equal(df['shift'], x['shift'])
+    assert list(df['subject']) == ['a', 'b']
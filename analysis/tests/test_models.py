@@ -0,0 +1,58 @@
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+from colortilt.models import fit_curves, make_model, Sinusoids
+
+FG = np.arange(-157.5, 180.0, 22.5)
+
+
+def dog_params():
+    """Known (canonical) amplitude, center, width and offset of several curves"""
+    return np.array([[5.0, 0.0, 30.0, 0.0],
+                     [-3.0, 12.0, 45.0, 1.5],
+                     [8.0, -25.0, 20.0, -2.0],
+                     [2.0, 40.0, 60.0, 0.5]])
+
+
+def test_fit_dog():
+    model = make_model('dog')
+    p = dog_params()
+    y = model(p, FG[np.newaxis, :])
+    fit, err, converged, gof = fit_curves(model, FG, y)
+    assert converged.all()
+    np.testing.assert_allclose(fit, p, atol=1e-6)
+    np.testing.assert_allclose(gof['rss'], 0.0, atol=1e-12)
+    np.testing.assert_allclose(gof['r2'], 1.0)
+
+
+def test_fit_dog_missing():
+    model = make_model('dog')
+    p = dog_params()
+    y = model(p, FG[np.newaxis, :])
+    y[:, 3] = np.nan
+    y[1, 10] = np.nan
+    fit, _, converged, gof = fit_curves(model, FG, y)
+    assert converged.all()
+    np.testing.assert_allclose(fit, p, atol=1e-6)
+
+
+def test_fit_dog_canonical():
+    model = make_model('dog')
+    p = dog_params()
+    flipped = p * np.array([-1.0, 1.0, -1.0, 1.0])
+    flipped[:, 1] += 360.0
+    np.testing.assert_allclose(model(flipped, FG[np.newaxis, :]), model(p, FG[np.newaxis, :]))
+    np.testing.assert_allclose(model.canonical(flipped), p)
+
+
+def test_fit_sinusoids():
+    model = Sinusoids(2)
+    p = np.array([[0.5, 3.0, -1.0, 0.8, 0.2],
+                  [-1.0, 0.0, 2.0, -0.5, 1.5]])
+    y = model(p, FG)
+    fit, err, converged, gof = fit_curves(model, FG, y)
+    assert converged.all()
+    np.testing.assert_allclose(fit, p, atol=1e-9)
+    np.testing.assert_allclose(gof['rss'], 0.0, atol=1e-12)
+    assert make_model('sin', harmonics=3).params == ['offset', 'sin1', 'cos1', 'sin2', 'cos2', 'sin3', 'cos3']
@@ -0,0 +1,97 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from colortilt.pipeline import Pipeline, TOOLS_PATH
+
+
+def trials(n=4):
+    """n trials for every size, bg and fg of two subjects"""
+    rng = np.random.RandomState(8)
+    index = pd.MultiIndex.from_product([['s0', 's1'], [10, 40, 160], [-1.0, 0.0, 90.0],
+                                        np.arange(-157.5, 180.0, 45.0), range(n)],
+                                       names=['subject', 'size', 'bg', 'fg', 'trial'])
+    df = index.to_frame(index=False).drop('trial', axis=1)
+    df['size'] = df['size'].astype(np.int16)
+    df['shift'] = rng.normal(5.0, 2.0, len(df))
+    df['phi'] = df['fg'] + df['shift']
+    return df
+
+
+def test_filter_size():
+    df = trials()
+    x = Pipeline.from_args(['filter', '--size', '40'])(df)
+    assert len(x) == len(df) // 3
+    assert set(x['size']) == {40}
+
+
+def test_filter_size_ana():
+    df = trials()
+    x = Pipeline.from_args(['filter', '--size', '40', '|', 'ana'])(df)
+    assert set(x['size']) == {40}
+    assert (x['N'] == 4).all()
+
+
+def test_filter_size_tool(tmpdir):
+    path = str(tmpdir.join('trials.csv'))
+    df = trials()
+    df.to_csv(path, index=False)
+    out = subprocess.check_output([sys.executable, os.path.join(TOOLS_PATH, 'ct-filter.py'),
+                                   '--size', '160', path])
+    lines = out.decode('utf-8').strip().split('\n')
+    assert lines[0].split(',') == list(df.columns)
+    assert len(lines) - 1 == len(df) // 3
+
+
+def means(subject='s0_s1'):
+    """ct-ana like means over size, bg and fg of one (combined) subject"""
+    rng = np.random.RandomState(9)
+    index = pd.MultiIndex.from_product([[0.0, 90.0], [10, 40, 160], np.arange(-157.5, 180.0, 22.5)],
+                                       names=['bg', 'size', 'fg'])
+    df = index.to_frame(index=False)
+    df['shift'] = rng.normal(0.0, 10.0, len(df))
+    df['err'] = rng.uniform(0.5, 2.0, len(df))
+    df['N'] = 4.0
+    df['subject'] = subject
+    return df
+
+
+def test_sizerel_avg():
+    df = means()
+    x = Pipeline.from_args(['sizerel'])(df)
+    assert list(x.columns) == ['bg', 'size', 'm_plus', 'm_minus', 'm_mean']
+    sel = df[(df.bg == 90.0) & (df['size'] == 40)]
+    row = x[(x.bg == 90.0) & (x['size'] == 40)].iloc[0]
+    assert row['m_plus'] == sel[sel.fg.isin([22.5, 67.5])]['shift'].max()
+    assert row['m_minus'] == sel[sel.fg.isin([-22.5, -67.5])]['shift'].min()
+
+
+def test_sizerel_avg_without_bg():
+    df = means()
+    x = Pipeline.from_args(['sizerel', '--mean'])(df[df.bg == 0.0].drop('bg', axis=1))
+    assert list(x.columns) == ['size', 'm_plus', 'm_minus', 'm_mean']
+    assert list(x['size']) == [10, 40, 160]
+    y = Pipeline.from_args(['sizerel', '--mean'])(df[df.bg == 0.0])
+    assert np.allclose(x['m_mean'], y['m_mean'])
+
+
+def test_szdiff_error():
+    df = means('s0')
+    x = Pipeline.from_args(['szdiff', '--dbm'])(df)
+    assert list(x.columns) == ['bg', 'fg', 'subject', 'N', 'err', 'szdiff']
+
+    # linear error propagation, with numeric derivatives
+    sel = df[(df.bg == 90.0) & (df.fg == 22.5)]
+    y, e = sel['shift'].values, sel['err'].values
+    f = lambda v: np.std(v) / np.mean(v)
+    h = 1e-6
+    d = [(f(y + h * (np.arange(len(y)) == i)) - f(y - h * (np.arange(len(y)) == i))) / (2 * h)
+         for i in range(len(y))]
+    row = x[(x.bg == 90.0) & (x.fg == 22.5)].iloc[0]
+    assert np.isclose(row['szdiff'], f(y))
+    assert np.isclose(row['err'], np.sqrt(np.sum(np.square(d) * e**2)), rtol=1e-5)
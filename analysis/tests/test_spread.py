@@ -0,0 +1,45 @@
+from __future__ import (absolute_import, division, print_function)
+
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from colortilt.tools.spread import max_spread
+from colortilt.pipeline import load_source, TOOLS_PATH
+
+
+def spreads():
+    return pd.DataFrame({'bg': [0.0, 0.0, 0.0, 45.0, 45.0, 90.0, 90.0],
+                         'fg': [-22.5, 22.5, 67.5, -22.5, 22.5, -22.5, 22.5],
+                         'subject': ['a'] * 7,
+                         'spread': [1.0, 3.0, 3.0, np.nan, np.nan, np.nan, 2.0]})
+
+
+def test_max_spread():
+    x = max_spread(spreads())
+    assert list(x['bg']) == [0.0, 90.0]
+    assert list(x['fg']) == [22.5, 22.5]
+
+
+def test_max_spread_all_nan():
+    x = spreads()
+    x['spread'] = np.nan
+    assert len(max_spread(x)) == 0
+
+
+def test_size_order():
+    order = load_source('ct_order', os.path.join(TOOLS_PATH, 'ct-order.py'))
+    rng = np.random.RandomState(16)
+    for k in [2, 3, 4, 10]:
+        sizes = np.arange(1, k + 1) * 10
+        df = pd.DataFrame({'g': np.repeat(np.arange(200), k), 'size': np.tile(sizes, 200),
+                           'shift': rng.randn(200 * k)})
+        gd, perms, idx = order.size_order(df, ['g'])
+        y = df['shift'].values.reshape(200, k)
+        expected = [tuple(sizes[np.argsort(row, kind='mergesort')]) for row in y]
+        assert [perms[i] for i in idx] == expected
+        if k <= 4:
+            every = list(itertools.permutations(sizes[::-1]))
+            assert [every[i] for i in idx] == expected
@@ -0,0 +1,155 @@
+from __future__ import (absolute_import, division, print_function)
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from colortilt.pipeline import Pipeline
+from colortilt.stats import group_bootstrap, group_stats, welch_chi2, PermutationTest
+
+
+def trials(n=5):
+    """n trials for every size, bg and fg of two subjects, with some NaN and inf shifts"""
+    rng = np.random.RandomState(11)
+    index = pd.MultiIndex.from_product([['s0', 's1'], [10, 40, 160], [-1.0, 0.0, 90.0],
+                                        np.arange(-157.5, 180.0, 45.0), range(n)],
+                                       names=['subject', 'size', 'bg', 'fg', 'trial'])
+    df = index.to_frame(index=False).drop('trial', axis=1)
+    df['shift'] = rng.normal(5.0, 2.0, len(df))
+    df.loc[::7, 'shift'] = np.nan
+    df.loc[3::11, 'shift'] = np.inf
+    return df
+
+
+def reference(df, groups, aggs):
+    finite = df[np.isfinite(df['shift'])]
+    return finite.groupby(groups).agg(**aggs).reset_index()
+
+
+def test_group_stats():
+    df = trials()
+    groups = ['bg', 'size', 'fg', 'subject']
+    st = group_stats(df, groups, 'shift')
+    ref = reference(df, groups, {'N': ('shift', 'count'), 'mean': ('shift', 'mean'),
+                                 'std': ('shift', 'std'), 'sem': ('shift', 'sem')})
+    pdt.assert_frame_equal(st, ref)
+
+
+def test_group_stats_empty_group():
+    df = pd.DataFrame({'g': [0, 0, 1, 1], 'shift': [1.0, 3.0, np.nan, np.inf]})
+    st = group_stats(df, ['g'], 'shift')
+    assert list(st['N']) == [2, 0]
+    assert st['mean'][0] == 2.0 and np.isnan(st['mean'][1])
+    assert np.isnan(st['sem'][1])
+
+
+def test_ana():
+    df = trials()
+    x = Pipeline.from_args(['ana'])(df)
+    ref = reference(df, ['bg', 'size', 'fg', 'subject'],
+                    {'N': ('shift', 'count'), 'err': ('shift', 'sem'), 'shift': ('shift', 'mean')})
+    ref['N'] = ref['N'].astype(np.float64)
+    pdt.assert_frame_equal(x, ref)
+
+
+def test_ana_combine():
+    df = trials()
+    x = Pipeline.from_args(['ana', '--combine'])(df)
+    ref = reference(df, ['bg', 'size', 'fg'],
+                    {'N': ('shift', 'count'), 'err': ('shift', 'sem'), 'shift': ('shift', 'mean')})
+    ref['N'] = ref['N'].astype(np.float64)
+    ref['subject'] = 's0_s1'
+    pdt.assert_frame_equal(x, ref)
+
+
+def test_bootstrap_jobs():
+    df = trials()
+    one = Pipeline.from_args(['ana', '--bootstrap', '200', '--seed', '3'])(df)
+    two = Pipeline.from_args(['ana', '--bootstrap', '200', '--seed', '3', '-j', '2'])(df)
+    pdt.assert_frame_equal(one, two)
+    assert (one['ci_low'] <= one['shift']).all() and (one['shift'] <= one['ci_high']).all()
+    other = Pipeline.from_args(['ana', '--bootstrap', '200', '--seed', '4'])(df)
+    assert not np.allclose(one['ci_low'], other['ci_low'])
+
+
+def test_bca_coverage():
+    # 200 skewed samples of 30 values with a mean of 2
+    rng = np.random.RandomState(12)
+    df = pd.DataFrame({'g': np.repeat(np.arange(200), 30), 'shift': rng.gamma(2.0, 1.0, 6000)})
+    lo, hi = group_bootstrap(df, ['g'], 'shift', 1000, alpha=0.1, method='bca', seed=1)
+    covered = np.mean((lo <= 2.0) & (2.0 <= hi))
+    assert 0.85 <= covered <= 0.95
+
+
+def exact_p(values, labels, strata):
+    """p-value of the labels over all relabelings within the strata, by enumeration"""
+    offsets = np.concatenate(([0], np.flatnonzero(np.diff(strata)) + 1, [len(values)]))
+    choices = [itertools.combinations(range(a, b), int(labels[a:b].sum()))
+               for a, b in zip(offsets[:-1], offsets[1:])]
+    relabeled = []
+    for pick in itertools.product(*choices):
+        l = np.zeros(len(values), dtype=bool)
+        l[list(itertools.chain(*pick))] = True
+        relabeled.append(l)
+    stats = welch_chi2(values, np.array(relabeled), offsets)
+    stat = welch_chi2(values, labels[np.newaxis, :], offsets)[0]
+    return np.mean(stats >= stat - 1e-9 * max(stat, 1.0)), len(relabeled)
+
+
+def test_permutation_exact():
+    # two strata of 6 values, 3 of each sample: 20 * 20 relabelings
+    values = np.array([1.0, 2.5, 2.0, 4.0, 3.5, 5.0, 0.5, 1.5, 1.0, 2.0, 3.0, 2.5])
+    labels = np.array([1, 1, 1, 0, 0, 0, 1, 0, 1, 0, 0, 1], dtype=bool)
+    strata = np.repeat([0.0, 45.0], 6)
+    p, count = exact_p(values, labels, strata)
+    assert count == 400
+
+    stat, p_mc, n, used = PermutationTest(20000, alpha=p, seed=5)((0, values, labels, strata))
+    assert np.isclose(stat, welch_chi2(values, labels[np.newaxis, :], np.array([0, 6, 12]))[0])
+    assert used == 2
+    assert n == 20000  # alpha is the exact p-value: no early decision
+    assert abs(p_mc - p) < 0.01
+
+
+def test_permutation_early_stop():
+    values = np.array([1.0, 2.5, 2.0, 4.0, 3.5, 5.0, 0.5, 1.5, 1.0, 2.0, 3.0, 2.5])
+    labels = np.array([1, 1, 1, 0, 0, 0, 1, 0, 1, 0, 0, 1], dtype=bool)
+    strata = np.repeat([0.0, 45.0], 6)
+    item = (0, values, labels, strata)
+
+    # p = 0.05 is far from alpha = 0.5: decided after the first batch
+    stat, p, n, _ = PermutationTest(20000, alpha=0.5, seed=5, batch=500)(item)
+    assert n == 500
+    # the same as drawing only those permutations
+    assert (stat, p, n) == PermutationTest(500, alpha=0.05, seed=5, batch=500)(item)[:3]
+    k = p * (n + 1) - 1
+    assert np.isclose(k, np.round(k))
+    assert abs(p - exact_p(values, labels, strata)[0]) < 0.05
+
+
+def test_permutation_jobs():
+    df = trials(n=6)
+    df = df[np.isfinite(df['shift'])]
+    one = Pipeline.from_args(['chi2', '--permutations', '300', '--seed', '2'])(df)
+    two = Pipeline.from_args(['chi2', '--permutations', '300', '--seed', '2', '-j', '2'])(df)
+    pdt.assert_frame_equal(one, two)
+    assert (one['permutations'] <= 300).all()
+
+
+def test_cmpold_permutations_need_trials(tmpdir):
+    df = trials()
+    df = df[np.isfinite(df['shift'])]
+    means = Pipeline.from_args(['ana'])(df)
+    old = str(tmpdir.join('old.csv'))
+    means[means['size'] == 40][['bg', 'fg', 'shift', 'err']].to_csv(old, index=False)
+
+    cmpold = Pipeline.from_args(['cmpold', 's0', old, '--permutations', '100'])
+    with pytest.raises(ValueError, match='trials of the old data set'):
+        cmpold(df)
+
+    df[df.subject == 's1'].to_csv(old, index=False)
+    x = cmpold(df)
+    assert list(x.columns) == ['bg', 'chi2', 'dof', 'p', 'permutations', 'sig']
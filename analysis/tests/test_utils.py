@@ -0,0 +1,27 @@
+from __future__ import (absolute_import, division, print_function)
+
+import matplotlib
+matplotlib.use('agg')
+
+import matplotlib.image
+import matplotlib.pyplot as plt
+import numpy as np
+
+from utils import ggexport
+
+
+def test_ggexport_raster(tmp_path):
+    # 8.3 x 5.7 cm at 300 dpi is not a whole number of pixels
+    figure = plt.figure()
+    plt.plot(np.sin(np.arange(50)))
+    exported = str(tmp_path / 'a.png')
+    ggexport(figure, [(exported, 'png', 8.3, 5.7)], units='cm', dpi=300, close=False)
+
+    saved = str(tmp_path / 'b.png')
+    figure.set_size_inches(8.3 / 2.54, 5.7 / 2.54)
+    figure.savefig(saved, dpi=300)
+    plt.close(figure)
+
+    a, b = matplotlib.image.imread(exported), matplotlib.image.imread(saved)
+    assert a.shape == b.shape == (673, 980, 4)
+    assert (a == b).all()
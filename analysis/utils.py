@@ -149,4 +149,83 @@ def ggsave(filename = None, plot = None, device = None, format = None,
         figure.set_size_inches(w,h)
     # close figure, if it was drawn by ggsave
     if not plot is None:
-        plt.close(figure)
\ No newline at end of file
+        plt.close(figure)
+
+# formats written from the pixels of a single Agg rendering
+RASTER_FORMATS = ('png', 'jpg', 'jpeg', 'tif', 'tiff', 'webp')
+
+TO_INCH = {"in": lambda x: x, "cm": lambda x: x / 2.54, "mm": lambda x: x / 25.4}
+
+
+def encode_raster(item):
+    """Write RGBA pixels to filename in format, e.g. for a ThreadPool.map"""
+    import matplotlib.image
+
+    filename, pixels, format, dpi = item
+    if format in ('jpg', 'jpeg'):
+        pixels = pixels[..., :3]
+    matplotlib.image.imsave(filename, pixels, format=format, dpi=dpi)
+
+
+def raster_size(figure, dpi):
+    """(width, height) in pixels of figure rendered at dpi, as its canvas reports it"""
+    original = figure.dpi
+    figure.dpi = dpi
+    try:
+        try:
+            return figure.canvas.get_width_height(physical=True)
+        except TypeError:  # matplotlib < 3.6
+            return figure.canvas.get_width_height()
+    finally:
+        figure.dpi = original
+
+
+def ggexport(plot, outputs, units="in", scale=1, dpi=300, pool=None, close=True, **kwargs):
+    """Save a figure in several formats and sizes, drawing it once per size
+
+    outputs is a list of (filename, format, width, height) in units.
+    For every size, the vector formats are written with savefig, while
+    all raster formats share one Agg rendering at dpi whose pixels are
+    then encoded, via pool.map if pool (e.g. a ThreadPool) is given.
+    kwargs are passed on to savefig.
+    """
+    import io
+    import numpy as np
+
+    if units not in TO_INCH:
+        raise Exception("units not 'in', 'cm', or 'mm'")
+    figure = plot
+    w, h = figure.get_size_inches()
+
+    sizes = []
+    for _, _, width, height in outputs:
+        if (width, height) not in sizes:
+            sizes.append((width, height))
+
+    pixels = []
+    try:
+        for width, height in sizes:
+            todo = [o for o in outputs if (o[2], o[3]) == (width, height)]
+            figure.set_size_inches(TO_INCH[units](width) * scale, TO_INCH[units](height) * scale)
+            # with a tight bounding box the size of the pixels is not known
+            tight = kwargs.get('bbox_inches', plt.rcParams['savefig.bbox']) == 'tight'
+            raster = [o for o in todo if o[1] in RASTER_FORMATS and not tight]
+            if raster:
+                buf = io.BytesIO()
+                figure.savefig(buf, format='rgba', dpi=dpi, **kwargs)
+                cols, rows = raster_size(figure, dpi)
+                rgba = np.frombuffer(buf.getvalue(), dtype=np.uint8).reshape(rows, cols, 4)
+                pixels += [(filename, rgba, fmt, dpi) for filename, fmt, _, _ in raster]
+            for filename, fmt, _, _ in todo:
+                if (filename, fmt, width, height) not in raster:
+                    figure.savefig(filename, format=fmt, dpi=dpi, **kwargs)
+    finally:
+        figure.set_size_inches(w, h)
+        if close:
+            plt.close(figure)
+
+    if pool is not None:
+        pool.map(encode_raster, pixels, chunksize=1)
+    else:
+        for item in pixels:
+            encode_raster(item)